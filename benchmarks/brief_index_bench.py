@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from benchmarks.import_time import placeholder_env
+
+# Microbenchmark of the near-duplicate brief index - builds the index from synthetic briefs,
+# then looks up trivial variations of indexed briefs (case, punctuation, Polish diacritics,
+# keyword word order) and unrelated new briefs. Reports lookup latency, recall and false matches.
+#
+#   python -m benchmarks.brief_index_bench --briefs 300000 --queries 20000
+
+WORDS = (
+    "kawiarnia piekarnia sklep restauracja salon fryzjer kancelaria biuro rachunkowe studio "
+    "fitness joga warsztat hotel pensjonat gabinet stomatolog weterynarz szkola jezykowa kursy "
+    "online nowoczesny rodzinny ekologiczny lokalny premium miejski wiejski tradycyjny autorski "
+    "coffee bakery shop restaurant salon studio office clinic boutique agency craft organic urban "
+    "warszawa krakow gdansk poznan wroclaw lodz katowicze szczecin lublin bydgoszcz torun opole "
+    "blue green minimal dark bright warm elegant playful bold classic vintage retro calm vivid"
+).split()
+
+# Letters with a Polish diacritic variant - users type both forms
+DIACRITICS = {"a": "ą", "c": "ć", "e": "ę", "l": "ł", "n": "ń", "o": "ó", "s": "ś", "z": "ż"}
+
+
+def random_brief(rng: random.Random):
+    keyword = " ".join(rng.sample(WORDS, rng.randint(2, 5)))
+    details = " ".join(rng.sample(WORDS, rng.randint(0, 8))) or None
+    return keyword, details
+
+# Same brief as a user would retype it - only keyword words may change order
+def variation(text: str, rng: random.Random, shuffle: bool = True):
+    words = text.split()
+    if shuffle:
+        rng.shuffle(words)
+    words = [
+        "".join(DIACRITICS.get(char, char) if rng.random() < 0.3 else char for char in word)
+        for word in words
+    ]
+    words = [word.upper() if rng.random() < 0.3 else word.capitalize() for word in words]
+    return ", ".join(words) + rng.choice(["", ".", "!", " "])
+
+
+def percentile(values: list, share: float):
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate brief index microbenchmark")
+    parser.add_argument("--briefs", type=int, default=300000, help="indexed briefs")
+    parser.add_argument("--queries", type=int, default=20000, help="lookups of each kind")
+    parser.add_argument("--memory", action="store_true", help="measure index memory (slower build)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.update(placeholder_env(tempfile.mkdtemp()))
+    os.environ["BRIEF_INDEX_MAX_ENTRIES"] = str(args.briefs)
+    from models import IndustryEnum
+    from services.brief_index import BriefIndex
+    industries = [industry.value for industry in IndustryEnum]
+
+    rng = random.Random(args.seed)
+    index = BriefIndex()
+    briefs = []
+    if args.memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    for number in range(args.briefs):
+        keyword, details = random_brief(rng)
+        industry = rng.choice(industries)
+        index.add(f"key{number}", keyword, industry, details)
+        briefs.append((f"key{number}", keyword, industry, details))
+    build_time = time.perf_counter() - started
+    if args.memory:
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    results = {}
+    for kind in ("variation", "new"):
+        timings = []
+        hits = 0
+        for _ in range(args.queries):
+            key, keyword, industry, details = rng.choice(briefs)
+            if kind == "variation":
+                keyword, details = variation(keyword, rng), details and variation(details, rng, shuffle=False)
+            else:
+                keyword, details = random_brief(rng)
+            started = time.perf_counter()
+            found = index.find(keyword, industry, details)
+            timings.append(time.perf_counter() - started)
+            hits += found == key if kind == "variation" else found is not None
+        results[kind] = (timings, hits)
+
+    print(f"indexed {args.briefs} briefs in {build_time:.1f}s ({args.briefs / build_time:.0f}/s)"
+          + (f", {memory / 1048576:.0f} MB ({memory / args.briefs:.0f} B per brief)" if args.memory else ""))
+    for kind, (timings, hits) in results.items():
+        label = "recall" if kind == "variation" else "false matches"
+        print(
+            f"{kind:>10}: p50 {statistics.median(timings) * 1e6:.0f} us, p99 {percentile(timings, 0.99) * 1e6:.0f} us, "
+            f"max {max(timings) * 1e6:.0f} us, {label} {hits / args.queries:.2%}"
+        )
+
+if __name__ == "__main__":
+    main()
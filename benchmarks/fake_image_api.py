@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import base64
+import io
+import json
+import random
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from PIL import Image, ImageDraw, ImageFilter
+
+# Stand-in for the images/generations endpoint - returns realistic base64 images
+# after configurable latency and answers a configurable share of requests with 429.
+# With "stream" and "partial_images" in the payload the answer is a stream of server-sent
+# events - blurred partial images spread over the latency, then the completed image.
+
+PIL_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+# Website-like picture: flat layout blocks over a noisy background, so encoded sizes
+# are close to real generated mockups (PNG around 2-3 MB at 1024x1536)
+def render_mockup(size: tuple, seed: int = 0):
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.blend(
+        Image.new("RGB", size, (240, 236, 228)),
+        Image.effect_noise(size, 48).convert("RGB"),
+        0.25
+    )
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, height // 12), fill=(32, 41, 64))
+    y = height // 8
+    while y < height - 100:
+        block = rng.randint(80, 260)
+        color = tuple(rng.randint(60, 230) for _ in range(3))
+        draw.rectangle((40, y, width - 40, y + block), fill=color)
+        for line in range(y + 20, y + block - 10, 18):
+            draw.rectangle((70, line, rng.randint(width // 3, width - 80), line + 6), fill=(250, 250, 250))
+        y += block + 30
+    return image
+
+
+class FakeImageAPI:
+
+    def __init__(self, latency: float, jitter: float, rate_429: float, retry_after: float, size: tuple):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.image = render_mockup(size)
+        # output_format -> base64 string, encoded once
+        self._encoded: dict = {}
+        self.stats = {"requests": 0, "throttled": 0, "images": 0, "partial_images": 0}
+
+    def encoded(self, output_format: str, compression: int):
+        key = (output_format, compression)
+        if key not in self._encoded:
+            buffer = io.BytesIO()
+            if output_format == "png":
+                self.image.save(buffer, "PNG")
+            else:
+                self.image.save(buffer, PIL_FORMATS[output_format], quality=compression)
+            self._encoded[key] = base64.b64encode(buffer.getvalue()).decode()
+        return self._encoded[key]
+
+    # Blurred, progressively sharper stand-in for partial image index of count
+    def partial(self, index: int, count: int):
+        image = self.image.filter(ImageFilter.GaussianBlur(radius=16 * (count - index) / count))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=60)
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    async def stream(self, latency: float, partials: int, image_b64: str):
+        for index in range(partials):
+            await asyncio.sleep(latency / (partials + 1))
+            event = {"type": "image_generation.partial_image", "partial_image_index": index, "b64_json": self.partial(index, partials)}
+            yield f"event: image_generation.partial_image\ndata: {json.dumps(event)}\n\n"
+            self.stats["partial_images"] += 1
+        await asyncio.sleep(latency / (partials + 1))
+        event = {"type": "image_generation.completed", "b64_json": image_b64}
+        yield f"event: image_generation.completed\ndata: {json.dumps(event)}\n\n"
+
+    async def generate(self, request: Request):
+        self.stats["requests"] += 1
+        payload = await request.json()
+        latency = max(0.0, random.gauss(self.latency, self.jitter))
+        if payload.get("stream") and random.random() >= self.rate_429:
+            self.stats["images"] += 1
+            image_b64 = self.encoded(payload.get("output_format", "png"), payload.get("output_compression", 100))
+            return StreamingResponse(
+                self.stream(latency, payload.get("partial_images", 0), image_b64),
+                media_type="text/event-stream"
+            )
+        await asyncio.sleep(latency)
+
+        if random.random() < self.rate_429:
+            self.stats["throttled"] += 1
+            return Response(
+                json.dumps({"error": {"message": "Rate limit exceeded", "type": "rate_limit"}}),
+                status_code=429,
+                media_type="application/json",
+                headers={"retry-after": str(self.retry_after)}
+            )
+
+        n = payload.get("n", 1)
+        image_b64 = self.encoded(payload.get("output_format", "png"), payload.get("output_compression", 100))
+        self.stats["images"] += n
+        body = json.dumps({
+            "created": 0,
+            "data": [{"b64_json": image_b64} for _ in range(n)]
+        })
+        return Response(body, media_type="application/json")
+
+
+def create_app(api: FakeImageAPI):
+    app = FastAPI()
+    app.add_api_route("/v1/images/generations", api.generate, methods=["POST"])
+    app.add_api_route("/stats", lambda: api.stats, methods=["GET"])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake image generation API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=20.0, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=5.0, help="latency standard deviation in seconds")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429")
+    parser.add_argument("--size", default="1024x1536")
+    args = parser.parse_args()
+
+    import uvicorn
+    width, height = (int(value) for value in args.size.split("x"))
+    api = FakeImageAPI(args.latency, args.jitter, args.rate_429, args.retry_after, (width, height))
+    uvicorn.run(create_app(api), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
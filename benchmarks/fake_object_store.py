@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import datetime
+import hashlib
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from services.sigv4 import sign_request
+
+# Stand-in for an S3-compatible object store (MinIO-style, path-style addressing) - the subset
+# the S3 storage backend uses: PUT/HEAD/GET object, multipart create/part/complete/abort and
+# presigned GET URLs. Objects are kept in memory, SigV4 signatures are verified.
+#
+#   python -m benchmarks.fake_object_store --port 8903 --access-key bench --secret-key bench-secret
+
+S3_XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def error(status: int, code: str, message: str):
+    body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code><Message>{message}</Message></Error>"
+    return Response(body, status_code=status, media_type="application/xml")
+
+
+class FakeObjectStore:
+
+    def __init__(self, access_key: str, secret_key: str, region: str, latency: float):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.latency = latency
+        # (bucket, key) -> (bytes, content type)
+        self.objects: dict = {}
+        # upload id -> {"bucket", "key", "content_type", "parts": {number: bytes}}
+        self.uploads: dict = {}
+        self.stats = {
+            "puts": 0,
+            "parts": 0,
+            "completed": 0,
+            "aborted": 0,
+            "heads": 0,
+            "gets": 0,
+            "denied": 0,
+            "bytes_received": 0,
+            "bytes_sent": 0
+        }
+
+    # Verify header or query (presigned) SigV4 signature, returns error response or None
+    def verify(self, request: Request, body: bytes):
+        query = dict(request.query_params)
+        if "X-Amz-Signature" in query:
+            signature = query.pop("X-Amz-Signature")
+            credential = query.get("X-Amz-Credential", "")
+            timestamp = query.get("X-Amz-Date", "")
+            signed_names = query.get("X-Amz-SignedHeaders", "host").split(";")
+            payload_hash = "UNSIGNED-PAYLOAD"
+            issued = datetime.datetime.strptime(timestamp, "%Y%m%dT%H%M%SZ").replace(tzinfo=datetime.timezone.utc)
+            if time.time() > issued.timestamp() + int(query.get("X-Amz-Expires", "0")):
+                return error(403, "AccessDenied", "Request has expired")
+        else:
+            authorization = request.headers.get("authorization", "")
+            if not authorization.startswith("AWS4-HMAC-SHA256 "):
+                return error(403, "AccessDenied", "Missing signature")
+            fields = dict(item.strip().split("=", 1) for item in authorization[len("AWS4-HMAC-SHA256 "):].split(","))
+            credential = fields.get("Credential", "")
+            signature = fields.get("Signature", "")
+            signed_names = fields.get("SignedHeaders", "").split(";")
+            timestamp = request.headers.get("x-amz-date", "")
+            payload_hash = request.headers.get("x-amz-content-sha256", "")
+            if payload_hash != hashlib.sha256(body).hexdigest():
+                return error(400, "XAmzContentSHA256Mismatch", "Payload hash does not match")
+
+        if credential.split("/")[0] != self.access_key:
+            return error(403, "InvalidAccessKeyId", "Unknown access key")
+        headers = {name: request.headers.get(name, "") for name in signed_names}
+        expected, _ = sign_request(
+            request.method, request.url.path, query, headers, payload_hash,
+            self.access_key, self.secret_key, self.region, timestamp
+        )
+        if expected != signature:
+            return error(403, "SignatureDoesNotMatch", "Signature does not match")
+        return None
+
+    async def handle(self, request: Request, bucket: str, key: str):
+        body = await request.body()
+        denied = self.verify(request, body)
+        if denied is not None:
+            self.stats["denied"] += 1
+            return denied
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        query = request.query_params
+        method = request.method
+        if method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {
+                "bucket": bucket,
+                "key": key,
+                "content_type": request.headers.get("content-type", "application/octet-stream"),
+                "parts": {}
+            }
+            return Response(
+                f"<InitiateMultipartUploadResult xmlns=\"{S3_XMLNS}\"><Bucket>{bucket}</Bucket>"
+                f"<Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>",
+                media_type="application/xml"
+            )
+        if "uploadId" in query:
+            upload = self.uploads.get(query["uploadId"])
+            if upload is None:
+                return error(404, "NoSuchUpload", "Unknown upload")
+            if method == "PUT":
+                upload["parts"][int(query["partNumber"])] = body
+                self.stats["parts"] += 1
+                self.stats["bytes_received"] += len(body)
+                return Response(headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+            if method == "DELETE":
+                del self.uploads[query["uploadId"]]
+                self.stats["aborted"] += 1
+                return Response(status_code=204)
+            data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+            self.objects[(bucket, key)] = (data, upload["content_type"])
+            del self.uploads[query["uploadId"]]
+            self.stats["completed"] += 1
+            return Response(
+                f"<CompleteMultipartUploadResult xmlns=\"{S3_XMLNS}\"><Key>{key}</Key></CompleteMultipartUploadResult>",
+                media_type="application/xml"
+            )
+
+        if method == "PUT":
+            self.objects[(bucket, key)] = (body, request.headers.get("content-type", "application/octet-stream"))
+            self.stats["puts"] += 1
+            self.stats["bytes_received"] += len(body)
+            return Response(headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+        stored = self.objects.get((bucket, key))
+        if stored is None:
+            return error(404, "NoSuchKey", "The specified key does not exist")
+        data, content_type = stored
+        if method == "HEAD":
+            self.stats["heads"] += 1
+            return Response(headers={"content-length": str(len(data)), "content-type": content_type})
+        self.stats["gets"] += 1
+        self.stats["bytes_sent"] += len(data)
+        return Response(data, media_type=content_type)
+
+    def get_stats(self):
+        return {**self.stats, "objects": len(self.objects), "pending_uploads": len(self.uploads)}
+
+
+def create_app(store: FakeObjectStore):
+    app = FastAPI()
+    app.add_api_route("/stats", store.get_stats, methods=["GET"])
+    app.add_api_route(
+        "/{bucket}/{key:path}", store.handle, methods=["GET", "HEAD", "PUT", "POST", "DELETE"]
+    )
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake S3-compatible object store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8903)
+    parser.add_argument("--access-key", default="bench")
+    parser.add_argument("--secret-key", default="bench-secret")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per request in seconds")
+    args = parser.parse_args()
+
+    import uvicorn
+    store = FakeObjectStore(args.access_key, args.secret_key, args.region, args.latency)
+    uvicorn.run(create_app(store), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
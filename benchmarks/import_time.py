@@ -0,0 +1,117 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Import-time budget check for worker cold start. Runs `python -X importtime -c "import main"`
+# in a fresh interpreter, prints the most expensive packages and app modules, and exits
+# with status 1 when the total exceeds the budget or a module that must load lazily
+# (see dependencies.py) is imported by the app module.
+#
+#   python -m benchmarks.import_time --budget-ms 900
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Imported on first use only - never while importing the app
+LAZY_MODULES = ["httpx", "aiosmtplib", "PIL", "openai"]
+
+# App packages reported module by module
+APP_PACKAGES = {"main", "config", "models", "dependencies", "logging_setup", "routes", "services"}
+
+
+# Minimal environment so config.Settings can be built without a .env file
+def placeholder_env(workdir: str):
+    env = dict(os.environ)
+    defaults = {
+        "OPENAI_API_KEY": "sk-import-time",
+        "SMTP_SERVER": "localhost",
+        "SMTP_PORT": "465",
+        "SMTP_USERNAME": "user",
+        "SMTP_PASSWORD": "password",
+        "SENDER_EMAIL": "sender@example.com",
+        "API_URL": "http://localhost:8000",
+        "IMAGE_STORAGE_PATH": os.path.join(workdir, "mockups"),
+        "TASK_STORE_PATH": os.path.join(workdir, "tasks.db"),
+        "STORAGE_INDEX_PATH": os.path.join(workdir, "mockups.db"),
+        "QUOTA_STORE_PATH": os.path.join(workdir, "quotas.db"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "MAX_RETRIES": "3",
+        "REQUEST_TIMEOUT": "120",
+        "ALLOWED_ORIGINS": "http://localhost",
+        "ALLOWED_IPS": "127.0.0.1",
+    }
+    for key, value in defaults.items():
+        env.setdefault(key, value)
+    return env
+
+
+# Parse -X importtime output into [(module, self_us, cumulative_us, depth)]
+def parse_importtime(output: str):
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure(env: dict):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=str(ROOT), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget report for the app module")
+    parser.add_argument("--budget-ms", type=float, default=900, help="max cumulative import time of main")
+    parser.add_argument("--repeat", type=int, default=3, help="runs, the fastest one is reported")
+    parser.add_argument("--top", type=int, default=10, help="packages and modules to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="mockup-import-") as workdir:
+        env = placeholder_env(workdir)
+        runs = [measure(env) for _ in range(args.repeat)]
+
+    entries = min(runs, key=lambda run: next(entry[2] for entry in run if entry[0] == "main"))
+    total_ms = next(entry[2] for entry in entries if entry[0] == "main") / 1000
+
+    packages = {}
+    app_modules = []
+    for name, self_us, cumulative_us, _ in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+        if package in APP_PACKAGES:
+            app_modules.append((name, self_us, cumulative_us))
+
+    print(f"import main: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, fastest of {args.repeat})\n")
+    print(f"{'package':<32}{'self ms':>10}{'share':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<32}{self_us / 1000:>10.1f}{self_us / 10 / total_ms:>7.1f}%")
+
+    print(f"\n{'app module':<32}{'self ms':>10}{'cumul ms':>10}")
+    for name, self_us, cumulative_us in sorted(app_modules, key=lambda item: -item[2])[:args.top]:
+        print(f"{name:<32}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import main took {total_ms:.1f} ms, budget is {args.budget_ms:.0f} ms")
+    imported = {entry[0].split(".")[0] for entry in entries}
+    for module in LAZY_MODULES:
+        if module in imported:
+            failures.append(f"{module} is imported eagerly - it should load on first use")
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import time
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from routes.ip_allowlist import IPAllowlistMiddleware, IPNetworkSet
+
+# Microbenchmark of the IP allowlist - per-request cost of the ASGI middleware compared with
+# the previous @app.middleware("http") version (BaseHTTPMiddleware) and with no middleware.
+# Requests are driven straight through the ASGI interface, no sockets involved.
+#
+#   python -m benchmarks.ip_allowlist_bench --requests 20000
+
+ALLOWED = ["127.0.0.1", "::1", "192.168.1.10"]
+# Realistic bigger list - office and VPN ranges
+RANGES = ALLOWED + [f"10.{i}.0.0/16" for i in range(20)] + ["2001:db8::/32"]
+
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def make_app():
+    return Starlette(routes=[Route("/api/v1/health", endpoint)])
+
+
+# Previous implementation - exact string match in a list inside BaseHTTPMiddleware
+def with_base_http_middleware(allowed_ips: list):
+    async def ip_allow(request: Request, call_next):
+        if request.client.host not in allowed_ips:
+            return JSONResponse(status_code=403, content={"detail": "Access denied"})
+        return await call_next(request)
+    return BaseHTTPMiddleware(make_app(), dispatch=ip_allow)
+
+
+def make_scope(client_ip: str, headers: list = ()):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/health",
+        "raw_path": b"/api/v1/health",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")] + list(headers),
+        "client": (client_ip, 50000),
+        "server": ("127.0.0.1", 8000)
+    }
+
+
+async def run(app, scope: dict, requests: int):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - started
+    return elapsed / requests * 1e6, statuses[-1]
+
+
+def bench_lookup(requests: int):
+    allowed_list = list(ALLOWED)
+    network_set = IPNetworkSet(RANGES)
+    results = {}
+    for name, container, host in (
+        ("list, exact", allowed_list, "192.168.1.10"),
+        ("network set, exact", network_set, "192.168.1.10"),
+        ("network set, CIDR", network_set, "10.19.4.5"),
+        ("network set, miss", network_set, "8.8.8.8"),
+    ):
+        started = time.perf_counter()
+        for _ in range(requests):
+            host in container
+        results[name] = (time.perf_counter() - started) / requests * 1e9
+    return results
+
+
+async def main(requests: int):
+    cases = [
+        ("no middleware", make_app(), make_scope("192.168.1.10")),
+        ("BaseHTTPMiddleware, list", with_base_http_middleware(list(ALLOWED)), make_scope("192.168.1.10")),
+        ("ASGI, exact IP", IPAllowlistMiddleware(make_app(), ALLOWED), make_scope("192.168.1.10")),
+        ("ASGI, CIDR ranges", IPAllowlistMiddleware(make_app(), RANGES), make_scope("10.19.4.5")),
+        ("ASGI, denied", IPAllowlistMiddleware(make_app(), RANGES), make_scope("8.8.8.8")),
+        (
+            "ASGI, X-Forwarded-For",
+            IPAllowlistMiddleware(make_app(), RANGES, trusted_proxies=["172.16.0.0/12"]),
+            make_scope("172.17.0.2", [(b"x-forwarded-for", b"10.3.2.1, 172.17.0.5")])
+        ),
+    ]
+
+    baseline = None
+    print(f"{'case':<28}{'us/request':>12}{'overhead':>12}{'status':>8}")
+    for name, app, scope in cases:
+        # Warm up caches and lazy imports
+        await run(app, scope, 200)
+        per_request, status = await run(app, scope, requests)
+        if baseline is None:
+            baseline = per_request
+        print(f"{name:<28}{per_request:>12.2f}{per_request - baseline:>+12.2f}{status:>8}")
+
+    print(f"\n{'lookup':<28}{'ns/lookup':>12}")
+    for name, per_lookup in bench_lookup(requests * 10).items():
+        print(f"{name:<28}{per_lookup:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IP allowlist microbenchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
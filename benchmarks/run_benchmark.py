@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import httpx
+from models import IndustryEnum
+
+# Offline end-to-end benchmark: starts the fake image API, the SMTP sink, optionally the fake
+# object store, and the app (uvicorn main:app) pointed at them, drives /api/v1/generate-mockup at fixed concurrency
+# and follows every task to completion. Reports throughput, end-to-end latency percentiles
+# and peak RSS of the app, and saves results as JSON for comparison between runs.
+#
+#   python -m benchmarks.run_benchmark --requests 200 --concurrency 20 --latency 5 --rate-429 0.05
+#   python -m benchmarks.run_benchmark --label http1 --app-env HTTP2_ENABLED=false --compare benchmarks/results/<file>.json
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+INDUSTRIES = [industry.value for industry in IndustryEnum]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test of the mockup API")
+    parser.add_argument("--requests", type=int, default=50, help="number of mockup requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--latency", type=float, default=5.0, help="fake image API mean latency (s)")
+    parser.add_argument("--jitter", type=float, default=1.0, help="fake image API latency std dev (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of upstream calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429")
+    parser.add_argument("--smtp-delay", type=float, default=0.0, help="SMTP sink delay per message (s)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--app-port", type=int, default=8900)
+    parser.add_argument("--api-port", type=int, default=8901)
+    parser.add_argument("--smtp-port", type=int, default=8925)
+    parser.add_argument("--storage", choices=["local", "s3"], default="local",
+                        help="storage backend, s3 runs against the fake object store")
+    parser.add_argument("--s3-port", type=int, default=8903)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, repeatable")
+    parser.add_argument("--task-timeout", type=float, default=600, help="give up following a task after (s)")
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--no-save", action="store_true", help="don't write results file")
+    return parser.parse_args()
+
+
+# Environment for the app under test - every external endpoint points at the local stand-ins
+def app_environment(args, workdir: Path):
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_API_URL": f"http://127.0.0.1:{args.api_port}/v1/images/generations",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(args.smtp_port),
+        "SMTP_USE_TLS": "false",
+        "SMTP_USERNAME": "benchmark",
+        "SMTP_PASSWORD": "benchmark",
+        "SENDER_EMAIL": "benchmark@example.com",
+        "API_URL": f"http://127.0.0.1:{args.app_port}",
+        "IMAGE_STORAGE_PATH": str(workdir / "mockups"),
+        "TASK_STORE_PATH": str(workdir / "tasks.db"),
+        "STORAGE_INDEX_PATH": str(workdir / "mockups.db"),
+        "QUOTA_STORE_PATH": str(workdir / "quotas.db"),
+        "LOG_DIR": str(workdir / "logs"),
+        "ALLOWED_IPS": "127.0.0.1",
+        "ALLOWED_ORIGINS": "http://localhost",
+        "MAX_RETRIES": env.get("MAX_RETRIES", "3"),
+        "REQUEST_TIMEOUT": env.get("REQUEST_TIMEOUT", "120"),
+        # The fake API has no quota - don't let the client-side limiter be the bottleneck
+        "UPSTREAM_REQUESTS_PER_MINUTE": "60000",
+        "UPSTREAM_BURST": "1000",
+    })
+    if args.storage == "s3":
+        env.update({
+            "STORAGE_BACKEND": "s3",
+            "S3_ENDPOINT_URL": f"http://127.0.0.1:{args.s3_port}",
+            "S3_BUCKET": "benchmark",
+            "S3_ACCESS_KEY_ID": "bench",
+            "S3_SECRET_ACCESS_KEY": "bench-secret",
+        })
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def start_process(command: list, env: dict = None):
+    return subprocess.Popen(command, cwd=str(ROOT), env=env)
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+# RSS of process and all its descendants in bytes (Linux /proc), None when unavailable
+def tree_rss(pid: int):
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return total or None
+    return total
+
+
+class RSSSampler:
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+
+    async def run(self):
+        while True:
+            rss = tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            await asyncio.sleep(self.interval)
+
+
+# Linear-interpolated percentile of sorted values
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+# Submit one mockup and follow its task with long-polling - returns outcome record
+async def run_request(client: httpx.AsyncClient, number: int, task_timeout: float):
+    started = time.monotonic()
+    request = {
+        "keyword": f"Benchmark business {number}",
+        "industry": INDUSTRIES[number % len(INDUSTRIES)],
+        "email": f"client{number}@example.com"
+    }
+    try:
+        response = await client.post("/api/v1/generate-mockup", json=request)
+    except httpx.HTTPError as e:
+        return {"outcome": "error", "error": str(e), "latency": time.monotonic() - started}
+    if response.status_code == 503:
+        return {"outcome": "rejected", "latency": time.monotonic() - started}
+    if response.status_code >= 400:
+        return {"outcome": "error", "error": f"HTTP {response.status_code}", "latency": time.monotonic() - started}
+
+    task_id = response.json()["task_id"]
+    status = "queued"
+    deadline = started + task_timeout
+    while time.monotonic() < deadline:
+        response = await client.get(f"/api/v1/task/{task_id}", params={"wait": 25, "last_status": status})
+        if response.status_code != 200:
+            return {"outcome": "error", "error": f"HTTP {response.status_code}", "latency": time.monotonic() - started}
+        task = response.json()
+        status = task["status"]
+        if status in ("completed", "failed"):
+            return {
+                "outcome": status,
+                "latency": time.monotonic() - started,
+                "email_sent": task.get("email_sent", False),
+                "upstream_retries": task.get("upstream", {}).get("retries", 0),
+                "error": task.get("error")
+            }
+    return {"outcome": "timeout", "latency": time.monotonic() - started}
+
+
+async def drive_load(args, app_pid: int):
+    sampler = RSSSampler(app_pid)
+    sampler_task = asyncio.create_task(sampler.run())
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", limits=limits, timeout=60) as client:
+        async def limited(number: int):
+            async with semaphore:
+                return await run_request(client, number, args.task_timeout)
+
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(limited(number) for number in range(args.requests)))
+        duration = time.monotonic() - started
+
+        app_stats = (await client.get("/api/v1/stats")).json()
+
+    async with httpx.AsyncClient() as client:
+        upstream_stats = (await client.get(f"http://127.0.0.1:{args.api_port}/stats")).json()
+
+    sampler_task.cancel()
+    return outcomes, duration, sampler.peak, app_stats, upstream_stats
+
+
+def summarize(args, outcomes: list, duration: float, peak_rss, app_stats: dict, upstream_stats: dict):
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome["outcome"]] = counts.get(outcome["outcome"], 0) + 1
+    latencies = sorted(outcome["latency"] for outcome in outcomes if outcome["outcome"] == "completed")
+    errors = sorted({outcome["error"] for outcome in outcomes if outcome.get("error")})
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT), capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "rate_429": args.rate_429,
+            "smtp_delay": args.smtp_delay,
+            "workers": args.workers,
+            "storage": args.storage,
+            "app_env": args.app_env
+        },
+        "results": {
+            "duration": round(duration, 3),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "rejected": counts.get("rejected", 0),
+            "errors": counts.get("error", 0) + counts.get("timeout", 0),
+            "rps": round(counts.get("completed", 0) / duration, 3) if duration else 0,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": latencies[-1] if latencies else None,
+            "peak_rss_mb": round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+            "upstream_retries": sum(outcome.get("upstream_retries", 0) for outcome in outcomes)
+        },
+        "error_messages": errors[:20],
+        "upstream": upstream_stats,
+        "app_stats": app_stats
+    }
+
+
+# Metrics compared between runs - True when higher is better
+COMPARED = {
+    "rps": True,
+    "latency_p50": False,
+    "latency_p95": False,
+    "latency_p99": False,
+    "peak_rss_mb": False,
+    "completed": True,
+    "failed": False,
+    "rejected": False
+}
+
+def print_report(summary: dict, baseline: dict = None):
+    results = summary["results"]
+    print(f"\n{summary['label']} @ {summary['commit']}: {summary['config']}")
+    header = f"{'metric':<14}{'value':>12}"
+    if baseline:
+        header += f"{baseline['label'][:12]:>14}{'change':>10}"
+    print(header)
+    for name, higher_is_better in COMPARED.items():
+        value = results.get(name)
+        line = f"{name:<14}{_fmt(value):>12}"
+        if baseline:
+            old = baseline["results"].get(name)
+            line += f"{_fmt(old):>14}"
+            if value is not None and old:
+                change = (value - old) / old * 100
+                better = (change > 0) == higher_is_better
+                line += f"{change:>+9.1f}%{'' if change == 0 else (' +' if better else ' -')}"
+        print(line)
+    if summary["error_messages"]:
+        print("errors:", "; ".join(summary["error_messages"]))
+
+def _fmt(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def main():
+    args = parse_args()
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    with tempfile.TemporaryDirectory(prefix="mockup-bench-") as workdir:
+        workdir = Path(workdir)
+        (workdir / "logs").mkdir()
+
+        processes = []
+        try:
+            processes.append(start_process([
+                sys.executable, "-m", "benchmarks.fake_image_api",
+                "--port", str(args.api_port),
+                "--latency", str(args.latency),
+                "--jitter", str(args.jitter),
+                "--rate-429", str(args.rate_429),
+                "--retry-after", str(args.retry_after)
+            ]))
+            processes.append(start_process([
+                sys.executable, "-m", "benchmarks.smtp_sink",
+                "--port", str(args.smtp_port),
+                "--delay", str(args.smtp_delay)
+            ]))
+            if args.storage == "s3":
+                processes.append(start_process([
+                    sys.executable, "-m", "benchmarks.fake_object_store",
+                    "--port", str(args.s3_port),
+                    "--access-key", "bench",
+                    "--secret-key", "bench-secret"
+                ]))
+                wait_for_port(args.s3_port)
+            wait_for_port(args.api_port)
+            wait_for_port(args.smtp_port)
+
+            app = start_process([
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--host", "127.0.0.1",
+                "--port", str(args.app_port),
+                "--workers", str(args.workers),
+                "--log-level", "warning"
+            ], env=app_environment(args, workdir))
+            processes.append(app)
+            wait_for_port(args.app_port)
+
+            outcomes, duration, peak_rss, app_stats, upstream_stats = asyncio.run(drive_load(args, app.pid))
+        finally:
+            for process in reversed(processes):
+                stop_process(process)
+
+    summary = summarize(args, outcomes, duration, peak_rss, app_stats, upstream_stats)
+    print_report(summary, baseline)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{args.label}.json"
+        path = RESULTS_DIR / name
+        path.write_text(json.dumps(summary, indent=2))
+        print(f"\nResults saved to {path}")
+
+if __name__ == "__main__":
+    main()
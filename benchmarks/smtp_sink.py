@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+
+# Local SMTP sink - accepts any login and any message and throws the message away.
+# Implements just enough of ESMTP for aiosmtplib (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT).
+
+
+class SMTPSink:
+
+    def __init__(self, delay: float = 0.0):
+        # Artificial delay before accepting each message (relay processing time)
+        self.delay = delay
+        self.stats = {"connections": 0, "messages": 0, "bytes": 0}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 smtp-sink ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb in ("EHLO", "HELO"):
+                    await reply("250-smtp-sink\r\n250-8BITMIME\r\n250-SIZE 52428800\r\n250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    parts = command.split()
+                    if len(parts) > 1 and parts[1].upper() == "LOGIN":
+                        # Username and password prompts, values are ignored
+                        await reply("334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await reply("235 Authentication successful")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    size = 0
+                    while True:
+                        data = await reader.readline()
+                        if not data or data == b".\r\n":
+                            break
+                        size += len(data)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    self.stats["messages"] += 1
+                    self.stats["bytes"] += size
+                    await reply("250 Message accepted")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8925)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before accepting each message")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.delay)
+    try:
+        asyncio.run(sink.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"SMTP sink: {sink.stats}", flush=True)
+
+if __name__ == "__main__":
+    main()
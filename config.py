@@ -9,6 +9,10 @@ class Settings(BaseModel):
 	OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
 	OPENAI_MODEL: str = "gpt-image-1-mini"
 	IMAGE_SIZE: str = "1024x1536"
+	OPENAI_API_URL: str = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/images/generations")
+	#Output encoding requested from the image API: png, jpeg or webp (compression 0-100 for jpeg/webp)
+	OUTPUT_FORMAT: str = os.getenv("OUTPUT_FORMAT", "png")
+	OUTPUT_COMPRESSION: int = int(os.getenv("OUTPUT_COMPRESSION", "85"))
 
 	#SMTP
 	SMTP_SERVER: str = os.getenv("SMTP_SERVER")
@@ -16,19 +20,164 @@ class Settings(BaseModel):
 	SMTP_USERNAME: str = os.getenv("SMTP_USERNAME")
 	SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD")
 	SENDER_EMAIL: str = os.getenv("SENDER_EMAIL")
+	#Implicit TLS (SMTPS) - disable for local relays and test sinks
+	SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+
+	#SMTP session pool & outbox
+	SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "2"))
+	SMTP_SESSION_MAX_IDLE: float = float(os.getenv("SMTP_SESSION_MAX_IDLE", "60"))
+	SMTP_OUTBOX_CONCURRENCY: int = int(os.getenv("SMTP_OUTBOX_CONCURRENCY", "2"))
+	SMTP_BATCH_WINDOW: float = float(os.getenv("SMTP_BATCH_WINDOW", "0.5"))
+	SMTP_BATCH_MAX: int = int(os.getenv("SMTP_BATCH_MAX", "10"))
+	SMTP_SEND_RETRIES: int = int(os.getenv("SMTP_SEND_RETRIES", "3"))
+	SMTP_RETRY_BACKOFF: float = float(os.getenv("SMTP_RETRY_BACKOFF", "2"))
 
 	#API
 	API_URL: str = os.getenv("API_URL")
 	IMAGE_STORAGE_PATH: str = os.getenv("IMAGE_STORAGE_PATH")
+	IMAGE_WORKER_MODE: str = os.getenv("IMAGE_WORKER_MODE", "thread")
+	IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", "2"))
+	IMAGE_QUEUE_SIZE: int = int(os.getenv("IMAGE_QUEUE_SIZE", "8"))
+
+	#Mockup storage - local (IMAGE_STORAGE_PATH only) or s3 (IMAGE_STORAGE_PATH as write-through cache)
+	STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+	STORAGE_RETRIES: int = int(os.getenv("STORAGE_RETRIES", "3"))
+	S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com")
+	S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+	S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
+	S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")
+	S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+	S3_PREFIX: str = os.getenv("S3_PREFIX", "mockups")
+	S3_PUBLIC_URL: str = os.getenv("S3_PUBLIC_URL", "")
+	S3_PRESIGN_EXPIRES: int = int(os.getenv("S3_PRESIGN_EXPIRES", "3600"))
+	S3_MULTIPART_THRESHOLD_MB: int = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8"))
+	S3_PART_SIZE_MB: int = int(os.getenv("S3_PART_SIZE_MB", "8"))
+	S3_UPLOAD_CONCURRENCY: int = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+
+	#Mockup retention in IMAGE_STORAGE_PATH - 0 disables the limit
+	STORAGE_INDEX_PATH: str = os.getenv("STORAGE_INDEX_PATH", "./data/mockups.db")
+	STORAGE_MAX_MB: int = int(os.getenv("STORAGE_MAX_MB", "0"))
+	STORAGE_MAX_AGE_DAYS: float = float(os.getenv("STORAGE_MAX_AGE_DAYS", "0"))
+	STORAGE_GC_INTERVAL: int = int(os.getenv("STORAGE_GC_INTERVAL", "300"))
+	STORAGE_GC_BATCH: int = int(os.getenv("STORAGE_GC_BATCH", "500"))
+	#Files accessed more recently are never evicted
+	STORAGE_GC_MIN_IDLE: int = int(os.getenv("STORAGE_GC_MIN_IDLE", "3600"))
+	#Temp files of crashed writers older than this are removed
+	STORAGE_TMP_GRACE: int = int(os.getenv("STORAGE_TMP_GRACE", "3600"))
+
+	#Image derivatives (thumbnail, web variant, email preview)
+	DERIVATIVES_ENABLED: bool = os.getenv("DERIVATIVES_ENABLED", "true").lower() == "true"
+	WEB_IMAGE_FORMAT: str = os.getenv("WEB_IMAGE_FORMAT", "webp")
+	WEB_IMAGE_QUALITY: int = int(os.getenv("WEB_IMAGE_QUALITY", "80"))
+	THUMBNAIL_WIDTH: int = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+	EMAIL_PREVIEW_WIDTH: int = int(os.getenv("EMAIL_PREVIEW_WIDTH", "800"))
+	EMAIL_PREVIEW_MAX_KB: int = int(os.getenv("EMAIL_PREVIEW_MAX_KB", "300"))
+
+	#Result cache for identical mockup requests
+	RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+	RESULT_CACHE_TTL: int = int(os.getenv("RESULT_CACHE_TTL", "86400"))
+	RESULT_CACHE_MEMORY_MB: int = int(os.getenv("RESULT_CACHE_MEMORY_MB", "128"))
+	RESULT_CACHE_DISK_MB: int = int(os.getenv("RESULT_CACHE_DISK_MB", "2048"))
+	#Near-duplicate briefs (case, punctuation, keyword word order, diacritics, small keyword edits) reuse the cached mockup
+	BRIEF_INDEX_ENABLED: bool = os.getenv("BRIEF_INDEX_ENABLED", "true").lower() == "true"
+	BRIEF_SIMILARITY_THRESHOLD: float = float(os.getenv("BRIEF_SIMILARITY_THRESHOLD", "0.9"))
+	BRIEF_INDEX_MAX_ENTRIES: int = int(os.getenv("BRIEF_INDEX_MAX_ENTRIES", "200000"))
 	MAX_RETRIES: int = int(os.getenv("MAX_RETRIES"))
 	REQUEST_TIMEOUT: int = int(os.getenv("REQUEST_TIMEOUT"))
 
+	#Warm pool - pre-generated mockups served at once to generic requests (no additional_details, generic keyword)
+	WARM_POOL_ENABLED: bool = os.getenv("WARM_POOL_ENABLED", "false").lower() == "true"
+	#Industries kept warm, empty - the WARM_POOL_TOP most requested
+	WARM_POOL_INDUSTRIES: str = os.getenv("WARM_POOL_INDUSTRIES", "")
+	WARM_POOL_TOP: int = int(os.getenv("WARM_POOL_TOP", "5"))
+	WARM_POOL_SIZE: int = int(os.getenv("WARM_POOL_SIZE", "3"))
+	#Refill hours in local time (e.g. 0-6,22-24), empty - any time the job queue is idle
+	WARM_POOL_HOURS: str = os.getenv("WARM_POOL_HOURS", "0-6")
+	WARM_POOL_DAILY_BUDGET: int = int(os.getenv("WARM_POOL_DAILY_BUDGET", "30"))
+	WARM_POOL_INTERVAL: int = int(os.getenv("WARM_POOL_INTERVAL", "60"))
+	#Estimated cost of one generation, only for reporting
+	WARM_POOL_IMAGE_COST: float = float(os.getenv("WARM_POOL_IMAGE_COST", "0"))
+	#Keyword words besides the industry name that keep a request generic
+	WARM_POOL_GENERIC_WORDS: str = os.getenv(
+		"WARM_POOL_GENERIC_WORDS",
+		"website,web,site,page,homepage,landing,www,online,modern,business,company,shop,store,"
+		"my,our,the,a,for,and,strona,internetowa,firma,firmy,sklep,dla,i"
+	)
+
+	#Stream and decode image API responses incrementally (constant memory per generation)
+	OPENAI_STREAM_DECODE: bool = os.getenv("OPENAI_STREAM_DECODE", "false").lower() == "true"
+	STREAM_SPOOL_MAX_KB: int = int(os.getenv("STREAM_SPOOL_MAX_KB", "512"))
+
+	#Partial images streamed by the image API during generation (0-3, 0 disables) - saved as low-res previews
+	OPENAI_PARTIAL_IMAGES: int = int(os.getenv("OPENAI_PARTIAL_IMAGES", "0"))
+	PREVIEW_WIDTH: int = int(os.getenv("PREVIEW_WIDTH", "384"))
+
+	#Max images requested in one upstream call (batch variants)
+	UPSTREAM_MAX_N: int = int(os.getenv("UPSTREAM_MAX_N", "4"))
+
+	#Upstream rate limiting & retries
+	UPSTREAM_REQUESTS_PER_MINUTE: float = float(os.getenv("UPSTREAM_REQUESTS_PER_MINUTE", "20"))
+	UPSTREAM_BURST: int = int(os.getenv("UPSTREAM_BURST", "5"))
+	RETRY_BACKOFF_BASE: float = float(os.getenv("RETRY_BACKOFF_BASE", "1"))
+	RETRY_BACKOFF_MAX: float = float(os.getenv("RETRY_BACKOFF_MAX", "30"))
+	RETRY_DEADLINE_FACTOR: float = float(os.getenv("RETRY_DEADLINE_FACTOR", "3"))
+
+	#HTTP connection pool (shared client for the image API)
+	HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+	HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+	HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+	HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+	#Task store
+	TASK_STORE_BACKEND: str = os.getenv("TASK_STORE_BACKEND", "sqlite")
+	TASK_STORE_PATH: str = os.getenv("TASK_STORE_PATH", "./data/tasks.db")
+	TASK_TTL: int = int(os.getenv("TASK_TTL", "86400"))
+	TASK_PURGE_INTERVAL: int = int(os.getenv("TASK_PURGE_INTERVAL", "300"))
+	TASK_LONG_POLL_MAX: float = float(os.getenv("TASK_LONG_POLL_MAX", "30"))
+	TASK_EVENTS_RECHECK: float = float(os.getenv("TASK_EVENTS_RECHECK", "2"))
+	SSE_KEEPALIVE: float = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+	#Job scheduler
+	JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+	JOB_QUEUE_SIZE: int = int(os.getenv("JOB_QUEUE_SIZE", "50"))
+	JOB_DEFAULT_DURATION: float = float(os.getenv("JOB_DEFAULT_DURATION", "45"))
+	JOB_DRAIN_TIMEOUT: float = float(os.getenv("JOB_DRAIN_TIMEOUT", "60"))
+
+	#Submission quotas per email and per client IP (sliding windows) - "<count>/<window>" list, empty disables
+	QUOTA_PER_EMAIL: str = os.getenv("QUOTA_PER_EMAIL", "")
+	QUOTA_PER_IP: str = os.getenv("QUOTA_PER_IP", "")
+	#memory - per worker process, sqlite - shared by all workers on the host (QUOTA_STORE_PATH)
+	QUOTA_BACKEND: str = os.getenv("QUOTA_BACKEND", "memory")
+	QUOTA_STORE_PATH: str = os.getenv("QUOTA_STORE_PATH", "./data/quotas.db")
+	#Seconds an Idempotency-Key returns the task of the first submission
+	IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+	#eager - services are started with the app, lazy - on first request that needs them
+	STARTUP_MODE: str = os.getenv("STARTUP_MODE", "eager")
+
 	#SECURITY
 	SECRET_KEY: str = os.getenv("SECRET_KEY")
 	ALLOWED_ORIGINS: list = os.getenv("ALLOWED_ORIGINS").split(",")
+	#IPs and CIDR ranges, IPv4 and IPv6 (e.g. 127.0.0.1,10.0.0.0/8,::1)
 	ALLOWED_IPS: list = os.getenv("ALLOWED_IPS").split(",")
+	#Reverse proxies whose X-Forwarded-For is trusted (IPs / CIDR ranges), empty - header ignored
+	TRUSTED_PROXIES: list = os.getenv("TRUSTED_PROXIES", "").split(",")
+
+	#Prometheus /metrics - scraper IPs, defaults to ALLOWED_IPS
+	METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+	METRICS_ALLOWED_IPS: list = os.getenv("METRICS_ALLOWED_IPS", os.getenv("ALLOWED_IPS")).split(",")
 
 	LOG_DIR: str = os.getenv("LOG_DIR")
+	LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+	#One JSON object per line with task_id instead of plain text
+	LOG_JSON: bool = os.getenv("LOG_JSON", "false").lower() == "true"
+	#main.<pid>.log (one per worker process) rotates at LOG_MAX_MB or every LOG_ROTATE_HOURS (0 - size only)
+	LOG_MAX_MB: int = int(os.getenv("LOG_MAX_MB", "50"))
+	LOG_ROTATE_HOURS: float = float(os.getenv("LOG_ROTATE_HOURS", "24"))
+	LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "10"))
+	LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+	#Max INFO/DEBUG records per second per logger, e.g. "httpx=20,services.image_service=50"
+	LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
 
 	class Config:
 		env_file = ".env"
@@ -0,0 +1,79 @@
+import asyncio
+import importlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from services.openai_service import OpenAIService
+    from services.email_service import EmailService
+    from services.image_service import ImageService
+
+# Lazily loaded service singletons. The service module - with its heavy imports (httpx,
+# aiosmtplib, Pillow) - is imported and the service started on first use, so importing the
+# app stays cheap. Request handlers receive services through Depends, the lifespan starts
+# them up front in eager STARTUP_MODE and closes whatever was loaded on shutdown.
+
+# name -> (module, singleton attribute), in start order
+SERVICES = {
+    "openai": ("services.openai_service", "openai_service"),
+    "email": ("services.email_service", "email_service"),
+    "image": ("services.image_service", "image_service"),
+}
+
+# name -> started service
+_loaded: dict = {}
+_lock = asyncio.Lock()
+
+
+async def get_service(name: str):
+    service = _loaded.get(name)
+    if service is not None:
+        return service
+    # Concurrent first requests import and start the service once
+    async with _lock:
+        if name not in _loaded:
+            module, attribute = SERVICES[name]
+            service = getattr(importlib.import_module(module), attribute)
+            await service.start()
+            _loaded[name] = service
+    return _loaded[name]
+
+async def get_openai_service() -> "OpenAIService":
+    return await get_service("openai")
+
+async def get_email_service() -> "EmailService":
+    return await get_service("email")
+
+async def get_image_service() -> "ImageService":
+    return await get_service("image")
+
+
+# Services used by the mockup pipeline, resolved by the handler and handed to the background job
+@dataclass
+class MockupServices:
+    openai: "OpenAIService"
+    image: "ImageService"
+    email: "EmailService"
+
+async def get_mockup_services():
+    return MockupServices(
+        openai=await get_openai_service(),
+        image=await get_image_service(),
+        email=await get_email_service()
+    )
+
+
+# Services loaded so far - name -> service
+def loaded_services():
+    return dict(_loaded)
+
+async def start_services():
+    for name in SERVICES:
+        await get_service(name)
+
+# Close loaded services in reverse start order
+async def close_services():
+    for name in reversed(list(SERVICES)):
+        service = _loaded.pop(name, None)
+        if service is not None:
+            await service.close()
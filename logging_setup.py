@@ -0,0 +1,247 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+# Task (or batch) currently processed by this asyncio task - attached to every log record
+current_task_id: contextvars.ContextVar = contextvars.ContextVar("task_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(task_label)s%(message)s"
+
+
+# Attach task_id to log records emitted inside the block
+@contextmanager
+def task_log_context(task_id: str):
+    token = current_task_id.set(task_id)
+    try:
+        yield
+    finally:
+        current_task_id.reset(token)
+
+
+# Parse "httpx=20,services.image_service=50" into {logger prefix: records per second}
+def parse_sampling(value: Optional[str]):
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.partition("=")
+        if name.strip() and limit.strip():
+            limits[name.strip()] = float(limit)
+    return limits
+
+
+# Log file of this process - uvicorn workers never rotate a file another worker writes to
+def process_log_path(log_dir: Path):
+    return log_dir / f"main.{os.getpid()}.log"
+
+def _running(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Remove log files (and backups) of exited processes not written for max_age seconds
+def prune_process_logs(log_dir: Path, max_age: float):
+    cutoff = time.time() - max_age
+    for path in log_dir.glob("main.*.log*"):
+        pid = path.name.split(".")[1]
+        try:
+            if pid.isdigit() and not _running(int(pid)) and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            continue
+
+
+# Rotates when the file reaches max_bytes or every interval seconds, whichever comes first.
+# Backups are numbered like RotatingFileHandler (main.<pid>.log.1 is the newest).
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float, encoding: str = "utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.rollover_at is not None:
+            self.rollover_at = time.time() + self.interval
+
+
+# Caps INFO/DEBUG records per logger (and its children) per second. Warnings and errors always pass.
+# The first record let through after a suppressed burst carries the count in record.suppressed.
+class SamplingFilter(logging.Filter):
+
+    def __init__(self, limits: dict):
+        super().__init__()
+        self.limits = limits
+        # logger name -> matching prefix (or None), resolved once per logger
+        self._prefixes: dict = {}
+        # prefix -> [window start, records in window, suppressed]
+        self._windows: dict = {}
+        self.suppressed = 0
+
+    def _prefix(self, name: str):
+        if name not in self._prefixes:
+            match = None
+            for prefix in self.limits:
+                if (name == prefix or name.startswith(prefix + ".")) and (match is None or len(prefix) > len(match)):
+                    match = prefix
+            self._prefixes[name] = match
+        return self._prefixes[name]
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING or not self.limits:
+            return True
+        prefix = self._prefix(record.name)
+        if prefix is None:
+            return True
+
+        now = time.monotonic()
+        window = self._windows.setdefault(prefix, [now, 0, 0])
+        if now - window[0] >= 1:
+            window[0], window[1] = now, 0
+        if window[1] >= self.limits[prefix]:
+            window[2] += 1
+            self.suppressed += 1
+            return False
+        window[1] += 1
+        if window[2]:
+            record.suppressed = window[2]
+            window[2] = 0
+        return True
+
+
+# Enqueues records for the writer thread without blocking - when max_size records are waiting
+# the record is dropped and counted. The queue itself is unbounded so the listener's stop
+# sentinel always fits. Formatting of the message (and traceback) happens here,
+# in the caller, because arguments may change after the call returns.
+class NonBlockingQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue: queue.Queue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord):
+        record = copy.copy(record)
+        record.task_id = current_task_id.get()
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+# TEXT_FORMAT with "[task_id] " before the message of records logged inside task_log_context
+class TextFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord):
+        task_id = getattr(record, "task_id", None)
+        record.task_label = f"[{task_id}] " if task_id else ""
+        return super().format(record)
+
+
+# One JSON object per line
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "task_id": getattr(record, "task_id", None)
+        }
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# Logging pipeline: application code -> NonBlockingQueueHandler -> queue -> writer thread
+# (QueueListener) -> rotating file of this process + console. Only the enqueue happens on the
+# event loop. Files of exited processes are removed once older than the rotation would keep them.
+class LoggingPipeline:
+
+    def __init__(self):
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.sampler: Optional[SamplingFilter] = None
+        self.listener: Optional[QueueListener] = None
+
+    def setup(self, settings):
+        if self.listener is not None:
+            return
+        log_dir = Path(settings.LOG_DIR)
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+        if settings.LOG_ROTATE_HOURS:
+            prune_process_logs(log_dir, settings.LOG_ROTATE_HOURS * 3600 * (settings.LOG_BACKUP_COUNT + 1))
+
+        formatter = JSONFormatter() if settings.LOG_JSON else TextFormatter(TEXT_FORMAT)
+        file_handler = SizeAndTimeRotatingFileHandler(
+            str(process_log_path(log_dir)),
+            max_bytes=settings.LOG_MAX_MB * 1024 * 1024,
+            backup_count=settings.LOG_BACKUP_COUNT,
+            interval=settings.LOG_ROTATE_HOURS * 3600
+        )
+        console_handler = logging.StreamHandler()
+        for handler in (file_handler, console_handler):
+            handler.setFormatter(formatter)
+
+        self.handler = NonBlockingQueueHandler(queue.Queue(), settings.LOG_QUEUE_SIZE)
+        self.sampler = SamplingFilter(parse_sampling(settings.LOG_SAMPLING))
+        self.handler.addFilter(self.sampler)
+
+        root = logging.getLogger()
+        root.setLevel(settings.LOG_LEVEL)
+        root.addHandler(self.handler)
+
+        self.listener = QueueListener(self.handler.queue, file_handler, console_handler, respect_handler_level=True)
+        self.listener.start()
+        # Flush what's left in the queue on interpreter exit
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is None:
+            return
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        logging.getLogger().removeHandler(self.handler)
+        self.listener = None
+
+    def get_stats(self):
+        if self.handler is None:
+            return {}
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.sampler.suppressed
+        }
+
+logging_pipeline = LoggingPipeline()
@@ -1,43 +1,68 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse
 import logging
 from pathlib import Path
 from config import settings
+from logging_setup import logging_pipeline
 from routes.mockup import router as mockup_router
+from routes.metrics import router as metrics_router
+from routes.static_files import MockupStaticFiles
+from routes.ip_allowlist import IPAllowlistMiddleware
+from dependencies import start_services, close_services
+from services.task_store import task_store_janitor
+from services.job_scheduler import job_scheduler
+from services.storage import storage
+from services.storage_retention import mockup_index, storage_retention
+from services.quotas import submission_quotas
+from services.warm_pool import warm_pool
+from contextlib import asynccontextmanager
 import json
 
-# Logging configuration
-
-LOG_FILE=f"{settings.LOG_DIR}/main.log"
-
-logging.basicConfig(
-    level="INFO",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+# Logging configuration - records go through a queue to a background writer thread
+# (rotating LOG_DIR/main.<pid>.log + console), see logging_setup.py
+logging_pipeline.setup(settings)
 
 logger = logging.getLogger(__name__)
 
+# App lifespan - open shared resources on startup and release them on shutdown
+@asynccontextmanager
+# In lazy STARTUP_MODE services are loaded by the first request that needs them (dependencies.py)
+async def lifespan(app: FastAPI):
+    if settings.STARTUP_MODE == "eager":
+        await start_services()
+    task_store_janitor.start()
+    storage_retention.start()
+    job_scheduler.start()
+    warm_pool.start()
+    yield
+    await warm_pool.close()
+    # Drain jobs first - they still need the services below
+    await job_scheduler.close(settings.JOB_DRAIN_TIMEOUT)
+    await task_store_janitor.close()
+    await storage_retention.close()
+    await submission_quotas.close()
+    await close_services()
+
 # Inicialize Fast API APP
 app = FastAPI(
     title="Website Mockup Generator API",
     description="API do generowania mockupów stron internetowych za pomocą AI",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 #Middleware for restricting IPs to allowed connections (in my case, only the frontend server)
-@app.middleware("http")
-async def ip_allow(req: Request, call_next):
-    if req.client.host not in settings.ALLOWED_IPS:
-        return JSONResponse(status_code=403, content={"detail": "Access denied"})
-    return await call_next(req)
+#Pure ASGI, IPs and CIDR ranges parsed once - routes/ip_allowlist.py
+#/metrics has its own list for the Prometheus scraper
+app.add_middleware(
+    IPAllowlistMiddleware,
+    allowed_ips=settings.ALLOWED_IPS,
+    trusted_proxies=settings.TRUSTED_PROXIES,
+    path_allowed_ips={"/metrics": settings.METRICS_ALLOWED_IPS}
+)
 
 #CORS
 app.add_middleware(
@@ -51,14 +76,24 @@ app.add_middleware(
 
 
 # Mount dir for mockups 
-# The directory is automatically created if it doesn't exist
+# The directory is created by the image service when it starts
+# Content-hashed files are served with immutable Cache-Control and strong ETag,
+# with an object store backend requests are redirected to it (services/storage.py)
+# Files sit in shard subdirectories, accesses are recorded for retention (services/storage_retention.py)
 mockups_path = Path(settings.IMAGE_STORAGE_PATH)
-mockups_path.mkdir(parents=True, exist_ok=True)
-app.mount("/mockups", StaticFiles(directory=str(mockups_path)), name="mockups")
+app.mount(
+    "/mockups",
+    MockupStaticFiles(directory=str(mockups_path), check_dir=False, storage=storage, index=mockup_index),
+    name="mockups"
+)
 
 #router with endpoints - routes/mockup.py
 app.include_router(mockup_router)
 
+#Prometheus metrics - routes/metrics.py
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
+
 
 @app.get("/")
 async def root():
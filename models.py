@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 # Enumeration with predefined values for allowed industries
@@ -153,6 +153,12 @@ class IndustryEnum(str, Enum):
     # Uncategorized
 	OTHER = "other"
 	
+# Output encodings supported by the image API
+class OutputFormatEnum(str, Enum):
+	PNG = "png"
+	JPEG = "jpeg"
+	WEBP = "webp"
+
 class MockupGenerationRequest(BaseModel):
 	"""Model for mockup generation request"""
 	keyword: str = Field(..., min_length=3, max_length=200, description="Phrase for mockup generation")
@@ -160,6 +166,8 @@ class MockupGenerationRequest(BaseModel):
 	email: EmailStr = Field(..., description="Client email address")
 	color_scheme: Optional[str] = Field(default="modern", description="Color scheme preference")
 	additional_details: Optional[str] = Field(default=None, max_length=500, description="Additional information or special requirements")
+	output_format: Optional[OutputFormatEnum] = Field(default=None, description="Image encoding requested from the image API, defaults to OUTPUT_FORMAT")
+	output_compression: Optional[int] = Field(default=None, ge=0, le=100, description="Compression level for jpeg/webp output, defaults to OUTPUT_COMPRESSION")
 
 class MockupGenerationResponse(BaseModel):
 	"""Model for mockup generation response"""
@@ -169,3 +177,26 @@ class MockupGenerationResponse(BaseModel):
 	task_id: Optional[str] = Field(None, description="Backend task ID for tracking")
 	email_sent: bool = Field(default=False, description="Whether confirmation email was sent to client")
 	created_at: Optional[str] = Field(None, description="Timestamp of mockup creation")
+
+class MockupBrief(BaseModel):
+	"""Single brief in a batch generation request"""
+	keyword: str = Field(..., min_length=3, max_length=200, description="Phrase for mockup generation")
+	industry: IndustryEnum = Field(..., description="Industry category")
+	color_scheme: Optional[str] = Field(default="modern", description="Color scheme preference")
+	additional_details: Optional[str] = Field(default=None, max_length=500, description="Additional information or special requirements")
+
+class MockupBatchRequest(BaseModel):
+	"""Model for batch / multi-variant mockup generation request"""
+	briefs: List[MockupBrief] = Field(..., min_length=1, max_length=10, description="Briefs to generate mockups for")
+	email: EmailStr = Field(..., description="Client email address")
+	variants: int = Field(default=1, ge=1, le=4, description="Number of variants generated for every brief")
+	output_format: Optional[OutputFormatEnum] = Field(default=None, description="Image encoding requested from the image API, defaults to OUTPUT_FORMAT")
+	output_compression: Optional[int] = Field(default=None, ge=0, le=100, description="Compression level for jpeg/webp output, defaults to OUTPUT_COMPRESSION")
+
+class MockupBatchResponse(BaseModel):
+	"""Model for batch mockup generation response"""
+	status: str = Field(..., description="Status: 'processing' or 'error'")
+	message: str = Field(..., description="Status message or error description")
+	batch_id: str = Field(..., description="Backend batch ID")
+	task_ids: List[str] = Field(..., description="Task ID for every variant, grouped by brief in request order")
+	created_at: Optional[str] = Field(None, description="Timestamp of batch creation")
@@ -0,0 +1,144 @@
+import ipaddress
+import json
+from typing import Iterable, Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Cached lookups per network set - client IPs repeat, parsing them does not need to
+LOOKUP_CACHE_SIZE = 4096
+
+DENIED_BODY = json.dumps({"detail": "Access denied"}).encode("utf-8")
+
+
+# Allowlist parsed once into integer (network, mask) pairs per IP version.
+# Single addresses go into a set, so the common case is one hash lookup.
+# Entries that are not IPs or CIDR ranges (e.g. "testclient") match the client string exactly.
+class IPNetworkSet:
+
+    def __init__(self, entries: Iterable[str]):
+        self.names = set()
+        self.addresses = set()
+        networks = []
+        for entry in entries:
+            entry = entry.strip()
+            if not entry:
+                continue
+            try:
+                networks.append(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                self.names.add(entry)
+
+        # (version, network int, mask int) for real ranges, merged where they overlap
+        self.ranges = []
+        for version in (4, 6):
+            same_version = [network for network in networks if network.version == version]
+            for network in ipaddress.collapse_addresses(same_version):
+                if network.num_addresses == 1:
+                    self.addresses.add((version, int(network.network_address)))
+                else:
+                    self.ranges.append((version, int(network.network_address), int(network.netmask)))
+        self._cache: dict = {}
+
+    def __contains__(self, host: str):
+        result = self._cache.get(host)
+        if result is None:
+            if len(self._cache) >= LOOKUP_CACHE_SIZE:
+                self._cache.clear()
+            result = self._cache[host] = self._match(host)
+        return result
+
+    def _match(self, host: str):
+        if host in self.names:
+            return True
+        address = parse_address(host)
+        if address is None:
+            return False
+        key = (address.version, int(address))
+        if key in self.addresses:
+            return True
+        version, value = key
+        return any(
+            version == range_version and value & mask == network
+            for range_version, network, mask in self.ranges
+        )
+
+    def __bool__(self):
+        return bool(self.names or self.addresses or self.ranges)
+
+
+# Parse IP, IPv4-mapped IPv6 (::ffff:1.2.3.4) is treated as IPv4. None for anything else.
+def parse_address(host: str):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+# Pure ASGI IP allowlist - no request/response wrapping, denied requests get 403 JSON.
+# With trusted proxies the client is the right-most X-Forwarded-For entry that is not
+# a trusted proxy itself; the header is ignored when the peer is not a trusted proxy.
+class IPAllowlistMiddleware:
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        allowed_ips: Iterable[str],
+        trusted_proxies: Iterable[str] = (),
+        path_allowed_ips: Optional[dict] = None
+    ):
+        self.app = app
+        self.allowed = IPNetworkSet(allowed_ips)
+        self.trusted_proxies = IPNetworkSet(trusted_proxies)
+        # Exact path -> own allowlist (e.g. /metrics for the scraper)
+        self.path_allowed = {path: IPNetworkSet(ips) for path, ips in (path_allowed_ips or {}).items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        allowed = self.path_allowed.get(scope["path"], self.allowed)
+        client = self.client_ip(scope)
+        if client is not None and client in allowed:
+            # Resolved client address for handlers (request.state.client_ip) - per-IP quotas
+            scope.setdefault("state", {})["client_ip"] = client
+            await self.app(scope, receive, send)
+            return
+
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(DENIED_BODY)).encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": DENIED_BODY})
+
+    def client_ip(self, scope: Scope):
+        client = scope.get("client")
+        if not client:
+            return None
+        peer = client[0]
+        if not self.trusted_proxies or peer not in self.trusted_proxies:
+            return peer
+
+        forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                # Repeated headers are one comma-separated list
+                forwarded = value if forwarded is None else forwarded + b"," + value
+        if not forwarded:
+            return peer
+
+        hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if hop not in self.trusted_proxies:
+                return hop
+        # Whole chain is trusted - left-most entry is the original client
+        return hops[0] if hops else peer
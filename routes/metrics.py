@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from services.metrics import registry, CONTENT_TYPE, TASKS_STORED, STORAGE_FILES, STORAGE_BYTES
+from services.task_store import task_store
+from services.storage_retention import mockup_index
+
+router = APIRouter(tags=["metrics"])
+
+
+# Prometheus scrape endpoint - access is limited to METRICS_ALLOWED_IPS by the IP middleware
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    TASKS_STORED.set(await task_store.count())
+    stored_files, stored_bytes = await mockup_index.totals()
+    STORAGE_FILES.set(stored_files)
+    STORAGE_BYTES.set(stored_bytes)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,32 +1,93 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime
+import asyncio
+import json
 import logging
+import os
+import time
 import uuid
-from models import MockupGenerationRequest, MockupGenerationResponse
-from services.openai_service import openai_service
-from services.email_service import email_service
-from services.image_service import image_service
+from typing import Optional
+from config import settings
+from logging_setup import logging_pipeline
+from models import MockupGenerationRequest, MockupGenerationResponse, MockupBatchRequest, MockupBatchResponse, MockupBrief
+from dependencies import MockupServices, get_mockup_services, loaded_services
+from services.image_service import ImageArtifact
 from services.email_validator import validate_email
+from services.result_cache import result_cache
+from services.brief_index import brief_index
+from services.task_store import task_store, FINAL_STATUSES
+from services.storage_retention import storage_retention
+from services.task_events import task_events
+from services.job_scheduler import job_scheduler, QueueFullError
+from services.quotas import submission_quotas, QuotaCostError, QuotaExceededError, IdempotencyConflictError
+from services.warm_pool import warm_pool
+from services.metrics import (
+    TASKS_TOTAL, TASK_DURATION, TASKS_IN_FLIGHT, QUOTA_REJECTED, FIRST_PREVIEW,
+    STAGE_VALIDATION, STAGE_SAVE, STAGE_DERIVATIVES, STAGE_EMAIL
+)
 
 # logger init
 logger = logging.getLogger(__name__)
 #router init
 router = APIRouter(prefix="/api/v1", tags=["mockups"])
 
-# In-memory storage for task states
-tasks_store = {}
+IDEMPOTENCY_KEY_MAX = 255
+# Job priority of requests served from the warm pool - ahead of upstream generations
+WARM_POOL_PRIORITY = -1
+
+# Client address resolved by the IP allowlist middleware (X-Forwarded-For from trusted proxies)
+def client_ip(http_request: Request):
+    address = getattr(http_request.state, "client_ip", None)
+    if address is None and http_request.client:
+        address = http_request.client.host
+    return address
+
+# Quota and idempotency rejections - 429 with Retry-After / 400 / 409, nothing was queued
+def submission_error(error: Exception):
+    if isinstance(error, QuotaCostError):
+        QUOTA_REJECTED.labels(scope=error.scope).inc()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Request creates {error.cost} mockups, the quota allows at most {error.limit} - "
+                   f"submit fewer briefs or variants"
+        )
+    if isinstance(error, QuotaExceededError):
+        QUOTA_REJECTED.labels(scope=error.scope).inc()
+        source = "this email address" if error.scope == "email" else "your network address"
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many mockup requests from {source}, please try again later",
+            headers={"Retry-After": str(error.retry_after)}
+        )
+    if isinstance(error, IdempotencyConflictError):
+        raise HTTPException(status_code=409, detail=str(error))
+
+# Atomic status transition + notification of clients waiting on this task (SSE / long-poll)
+async def set_task_status(task_id: str, data: dict, from_statuses: Optional[tuple] = None):
+    changed = await task_store.transition(task_id, data, from_statuses=from_statuses)
+    if changed:
+        task_events.publish(task_id, data)
+    return changed
 
 # Mockup generation endpoint
 @router.post("/generate-mockup", response_model=MockupGenerationResponse)
 async def generate_mockup(
     request: MockupGenerationRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request,
+    services: MockupServices = Depends(get_mockup_services),
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX)
 ):
     if not validate_email(request.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
 
     task_id = str(uuid.uuid4())
+    response = MockupGenerationResponse(
+        status="processing",
+        message="Your mockup is being generated. You'll receive an email when it's ready.",
+        task_id=task_id,
+        created_at=datetime.now().isoformat()
+    )
     
     try:
         # Walidacja podstawowa
@@ -35,95 +96,553 @@ async def generate_mockup(
                 status_code=400,
                 detail="Keyword cannot be empty"
             )
-        
-        # Dodaj task do background
-        background_tasks.add_task(
-            process_mockup_generation,
-            task_id,
-            request
+
+        # Repeated submission - same task, no quota used
+        replay = await submission_quotas.claim_idempotency_key(
+            "generate-mockup", request.email, idempotency_key, request.model_dump_json(), response.model_dump()
         )
+        if replay is not None:
+            return JSONResponse(replay, headers={"Idempotent-Replayed": "true"})
+
+        try:
+            # Admission control and quotas - reject before creating any task state
+            job_scheduler.check_admission()
+            await submission_quotas.admit(request.email, client_ip(http_request))
+        except Exception:
+            await submission_quotas.release_idempotency_key("generate-mockup", request.email, idempotency_key)
+            raise
+
+        try:
+            # Task record visible to every worker before background processing starts
+            await task_store.create(task_id, {"status": "queued"})
+
+            # Dodaj task do kolejki - generic briefs with a pooled mockup skip ahead of generations
+            warm = warm_pool.eligible(request)
+            try:
+                position = job_scheduler.submit(
+                    task_id,
+                    process_mockup_generation,
+                    services,
+                    task_id,
+                    request,
+                    warm,
+                    priority=WARM_POOL_PRIORITY if warm and warm_pool.available(request.industry.value) else 0,
+                    on_drop=drop_mockup_generation
+                )
+            except QueueFullError:
+                await set_task_status(task_id, {"status": "failed", "error": "Server is busy"})
+                raise
+        except Exception:
+            # Not queued - the quota is given back and a retry with the same key may go ahead
+            await submission_quotas.refund(request.email, client_ip(http_request))
+            await submission_quotas.release_idempotency_key("generate-mockup", request.email, idempotency_key)
+            raise
+        # Record initial position for other workers - skipped if the job already started
+        await set_task_status(task_id, {"status": "queued", **position}, from_statuses=("queued",))
         
-        return MockupGenerationResponse(
-            status="processing",
-            message="Your mockup is being generated. You'll receive an email when it's ready.",
-            task_id=task_id,
-            created_at=datetime.now().isoformat()
-        )
+        return response
         
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        submission_error(e)
         logger.error(f"Error in generate_mockup: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Save image as received (no re-encoding) with thumbnail, web variant and email preview - generated once at save time.
+# Returns (file_url, derivatives, email attachment, attachment filename, stored bytes) - the attachment is
+# a small preview linking to the full file, full image only if preview is unavailable.
+async def store_mockup(services: MockupServices, artifact: ImageArtifact):
+    with STAGE_SAVE.time():
+        file_path, file_url = await services.image.save_image(artifact)
+        stored_bytes = os.path.getsize(file_path)
+    with STAGE_DERIVATIVES.time():
+        derivatives, email_preview = await services.image.create_derivatives(artifact, file_path)
+    if email_preview is not None:
+        return file_url, derivatives, email_preview, "mockup_preview.jpg", stored_bytes
+    return file_url, derivatives, artifact.buffer, f"mockup{os.path.splitext(file_path)[1]}", stored_bytes
+
+# Sizes reported on the task - transferred is the upstream wire size (0 when served from cache)
+def size_report(artifact: ImageArtifact, stored_bytes: int, transferred: int):
+    return {
+        "format": artifact.format,
+        "transferred": transferred,
+        "decoded": artifact.size_bytes,
+        "stored": stored_bytes
+    }
+
+# Count finished task per industry and observe its processing time
+def record_task(industry: str, status: str, started: float):
+    TASKS_TOTAL.labels(industry=industry, status=status).inc()
+    TASK_DURATION.labels(status=status).observe(time.perf_counter() - started)
+
+# Validate image, timed as its own pipeline stage
+async def validate_artifact(services: MockupServices, artifact: ImageArtifact):
+    with STAGE_VALIDATION.time():
+        return await services.image.validate_image_data(artifact)
+
 # Async Background processing
 async def process_mockup_generation(
+    services: MockupServices,
     task_id: str,
-    request: MockupGenerationRequest
+    request: MockupGenerationRequest,
+    warm: bool = False
 ):
-    
+    # Upstream retry / throttle counters reported on the task
+    upstream_stats = {}
+    output = services.openai.output_options(request.output_format, request.output_compression)
+    started = time.perf_counter()
+    TASKS_IN_FLIGHT.inc()
+
+    # Low-res partial image previews published on the task while generating
+    previews = {"previews": []}
+
+    async def publish_preview(index: int, image_data: bytes):
+        try:
+            url = await services.image.save_preview(image_data)
+        except Exception as e:
+            # Previews are optional - the generation goes on
+            logger.warning(f"Failed to save preview {index} of task {task_id}: {str(e)}")
+            return
+        if not previews["previews"]:
+            elapsed = time.perf_counter() - started
+            FIRST_PREVIEW.observe(elapsed)
+            previews["first_preview_after"] = round(elapsed, 2)
+        previews["previews"] = previews["previews"] + [url]
+        await set_task_status(task_id, {"status": "generating", **previews}, from_statuses=("generating",))
+
     try:
-        tasks_store[task_id] = {"status": "generating"}
-        
-        # Generate mockup
-        image_b64, revised_prompt = await openai_service.generate_mockup(
-            keyword=request.keyword,
-            industry=request.industry.value,
-            additional_details=request.additional_details
-        )
-        
-        # Image validation
-        if not image_service.validate_image_data(image_b64):
-            raise Exception("Generated image validation failed")
+        await set_task_status(task_id, {"status": "generating"}, from_statuses=("queued",))
         
-        # Save file
-        file_path, file_url = image_service.save_image(
-            image_b64,
-            request.keyword,
-            format="png"
-        )
+        # Generate mockup - identical requests are served from cache or share one upstream call
+        async def generate():
+            # Base64 is decoded once (or while streaming) - the same bytes go to validation, storage and email
+            image_data, revised_prompt = await services.openai.generate_mockup_image(
+                keyword=request.keyword,
+                industry=request.industry.value,
+                additional_details=request.additional_details,
+                stats=upstream_stats,
+                output=output,
+                on_partial=publish_preview
+            )
+            artifact = ImageArtifact(image_data)
+
+            # Image validation - invalid images never reach the cache
+            if not await validate_artifact(services, artifact):
+                raise Exception("Generated image validation failed")
+            return artifact.data, revised_prompt
+
+        # Generic brief - pre-generated mockup from the warm pool if there is one
+        pooled = await warm_pool.take(services, request.industry.value) if warm else None
+        if pooled is not None:
+            image_data, revised_prompt = pooled
+            cache_source = "warm_pool"
+        else:
+            cache_key = result_cache.make_key(
+                request.keyword,
+                request.industry.value,
+                request.additional_details,
+                output
+            )
+            # Near-duplicate of an earlier brief - its cached mockup instead of a new generation
+            cached = None
+            similar_key = brief_index.find(request.keyword, request.industry.value, request.additional_details, output)
+            if similar_key is not None and similar_key != cache_key:
+                cached = await result_cache.get(similar_key)
+                if cached is None:
+                    brief_index.remove(similar_key, stale=True)
+            if cached is not None:
+                image_data, revised_prompt, _ = cached
+                cache_source = "similar"
+            else:
+                image_data, revised_prompt, cache_source = await result_cache.get_or_generate(cache_key, generate)
+                brief_index.add(cache_key, request.keyword, request.industry.value, request.additional_details, output)
+        artifact = ImageArtifact(image_data)
         
-        # Decode base64 for email attachment
-        import base64
-        image_bytes = base64.b64decode(image_b64)
+        # Save file with derivatives
+        file_url, derivatives, attachment, attachment_name, stored_bytes = await store_mockup(services, artifact)
         
-        # Update task status to completed
-        tasks_store[task_id] = {"status": "sending_email"}
-        email_sent = await email_service.send_mockup_email(
-            recipient_email=request.email,
-            image_data=image_bytes,
-            image_filename="mockup.png",
-            keyword=request.keyword,
-            industry=request.industry.value
-        )
+        # Update task status to sending_email
+        await set_task_status(task_id, {"status": "sending_email"}, from_statuses=("generating",))
+        with STAGE_EMAIL.time():
+            delivery = await services.email.send_mockup_email(
+                recipient_email=request.email,
+                image_data=attachment,
+                image_filename=attachment_name,
+                keyword=request.keyword,
+                industry=request.industry.value,
+                full_image_url=file_url
+            )
         
         # Update task status to completed
-        tasks_store[task_id] = {
+        await set_task_status(task_id, {
             "status": "completed",
             "image_url": file_url,
-            "email_sent": email_sent,
+            "derivatives": derivatives,
+            "email_sent": delivery["status"] == "sent",
+            "email_delivery": delivery,
+            "cache": cache_source,
+            "upstream": upstream_stats,
+            "bytes": size_report(artifact, stored_bytes, upstream_stats.get("bytes_transferred", 0)),
+            **(previews if previews["previews"] else {}),
             "completed_at": datetime.now().isoformat()
-        }
+        }, from_statuses=("sending_email",))
         
+        record_task(request.industry.value, "completed", started)
         logger.info(f"Task {task_id} completed successfully")
         
     except Exception as e:
         logger.error(f"Error processing task {task_id}: {str(e)}")
-        tasks_store[task_id] = {
+        record_task(request.industry.value, "failed", started)
+        await set_task_status(task_id, {
             "status": "failed",
-            "error": str(e)
-        }
+            "error": str(e),
+            "upstream": upstream_stats
+        })
+    finally:
+        TASKS_IN_FLIGHT.dec()
+
+# Job dropped from the queue or cancelled on shutdown - mark it failed
+async def drop_mockup_generation(task_id: str):
+    await set_task_status(task_id, {
+        "status": "failed",
+        "error": "Server shutting down, please submit again"
+    })
+
+# Batch / multi-variant generation endpoint - one task per variant, one email for the whole batch
+@router.post("/generate-mockup-batch", response_model=MockupBatchResponse)
+async def generate_mockup_batch(
+    request: MockupBatchRequest,
+    http_request: Request,
+    services: MockupServices = Depends(get_mockup_services),
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX)
+):
+    if not validate_email(request.email):
+        raise HTTPException(status_code=400, detail="Invalid email format")
+
+    batch_id = str(uuid.uuid4())
+
+    try:
+        if any(not brief.keyword.strip() for brief in request.briefs):
+            raise HTTPException(
+                status_code=400,
+                detail="Keyword cannot be empty"
+            )
+
+        # Equivalent briefs share upstream calls - their variants are requested together with n
+        output = services.openai.output_options(request.output_format, request.output_compression)
+        task_ids = []
+        groups = {}
+        for brief in request.briefs:
+            key = result_cache.make_key(brief.keyword, brief.industry.value, brief.additional_details, output)
+            group = groups.setdefault(key, {"brief": brief, "task_ids": []})
+            for _ in range(request.variants):
+                task_id = str(uuid.uuid4())
+                task_ids.append(task_id)
+                group["task_ids"].append(task_id)
+
+        response = MockupBatchResponse(
+            status="processing",
+            message="Your mockups are being generated. You'll receive one email when they're ready.",
+            batch_id=batch_id,
+            task_ids=task_ids,
+            created_at=datetime.now().isoformat()
+        )
+        replay = await submission_quotas.claim_idempotency_key(
+            "generate-mockup-batch", request.email, idempotency_key, request.model_dump_json(), response.model_dump()
+        )
+        if replay is not None:
+            return JSONResponse(replay, headers={"Idempotent-Replayed": "true"})
+
+        try:
+            # Admission control - whole batch is one job, every mockup counts against the quotas
+            job_scheduler.check_admission()
+            await submission_quotas.admit(request.email, client_ip(http_request), cost=len(task_ids))
+        except Exception:
+            await submission_quotas.release_idempotency_key("generate-mockup-batch", request.email, idempotency_key)
+            raise
+
+        async def drop_batch(job_id: str):
+            for task_id in task_ids:
+                await drop_mockup_generation(task_id)
+
+        try:
+            for task_id in task_ids:
+                await task_store.create(task_id, {"status": "queued", "batch_id": batch_id})
+
+            try:
+                job_scheduler.submit(
+                    batch_id,
+                    process_batch_generation,
+                    services,
+                    batch_id,
+                    list(groups.values()),
+                    request,
+                    output,
+                    on_drop=drop_batch
+                )
+            except QueueFullError:
+                for task_id in task_ids:
+                    await set_task_status(task_id, {"status": "failed", "batch_id": batch_id, "error": "Server is busy"})
+                raise
+        except Exception:
+            # Not queued - the quota is given back and a retry with the same key may go ahead
+            await submission_quotas.refund(request.email, client_ip(http_request), cost=len(task_ids))
+            await submission_quotas.release_idempotency_key("generate-mockup-batch", request.email, idempotency_key)
+            raise
+
+        return response
+
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        submission_error(e)
+        logger.error(f"Error in generate_mockup_batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Generate all variants of one brief in a single upstream call (n = number of tasks).
+# Returns list of stored mockups ready for the batch email.
+async def generate_batch_variants(services: MockupServices, batch_id: str, brief: MockupBrief, task_ids: list, output: dict):
+    upstream_stats = {}
+    started = time.perf_counter()
+    for task_id in task_ids:
+        await set_task_status(task_id, {"status": "generating", "batch_id": batch_id}, from_statuses=("queued",))
+
+    try:
+        images, revised_prompt = await services.openai.generate_mockup_images(
+            keyword=brief.keyword,
+            industry=brief.industry.value,
+            additional_details=brief.additional_details,
+            n=len(task_ids),
+            stats=upstream_stats,
+            output=output
+        )
+    except Exception as e:
+        logger.error(f"Error processing batch {batch_id}: {str(e)}")
+        for task_id in task_ids:
+            record_task(brief.industry.value, "failed", started)
+            await set_task_status(task_id, {"status": "failed", "batch_id": batch_id, "error": str(e), "upstream": upstream_stats})
+        return []
+
+    mockups = []
+    for variant, task_id in enumerate(task_ids):
+        try:
+            if variant >= len(images):
+                raise Exception("Image API returned fewer images than requested")
+
+            artifact = ImageArtifact(images[variant])
+            if not await validate_artifact(services, artifact):
+                raise Exception("Generated image validation failed")
+
+            file_url, derivatives, attachment, attachment_name, stored_bytes = await store_mockup(services, artifact)
+            await set_task_status(task_id, {"status": "sending_email", "batch_id": batch_id}, from_statuses=("generating",))
+            mockups.append({
+                "task_id": task_id,
+                "keyword": brief.keyword,
+                "industry": brief.industry.value,
+                "image_data": attachment,
+                "image_filename": attachment_name,
+                "image_url": file_url,
+                "derivatives": derivatives,
+                "upstream": upstream_stats,
+                # One response carries all variants - transferred bytes are split evenly
+                "bytes": size_report(artifact, stored_bytes, upstream_stats.get("bytes_transferred", 0) // len(task_ids)),
+                "started": started
+            })
+        except Exception as e:
+            logger.error(f"Error processing task {task_id}: {str(e)}")
+            record_task(brief.industry.value, "failed", started)
+            await set_task_status(task_id, {"status": "failed", "batch_id": batch_id, "error": str(e), "upstream": upstream_stats})
+    return mockups
+
+# Async batch processing - upstream calls run concurrently, then one email with all variants
+async def process_batch_generation(services: MockupServices, batch_id: str, groups: list, request: MockupBatchRequest, output: dict):
+    calls = []
+    for group in groups:
+        task_ids = group["task_ids"]
+        for start in range(0, len(task_ids), settings.UPSTREAM_MAX_N):
+            calls.append(generate_batch_variants(services, batch_id, group["brief"], task_ids[start:start + settings.UPSTREAM_MAX_N], output))
+
+    in_flight = sum(len(group["task_ids"]) for group in groups)
+    TASKS_IN_FLIGHT.inc(in_flight)
+    try:
+        await finish_batch(services, batch_id, request, await asyncio.gather(*calls))
+    finally:
+        TASKS_IN_FLIGHT.dec(in_flight)
+
+# Send one email with all generated variants and complete their tasks
+async def finish_batch(services: MockupServices, batch_id: str, request: MockupBatchRequest, results: list):
+    mockups = [mockup for result in results for mockup in result]
+    if not mockups:
+        return
+
+    # Unique attachment names in the order of the briefs
+    for number, mockup in enumerate(mockups, start=1):
+        mockup["image_filename"] = f"{number}_{mockup['image_filename']}"
+
+    with STAGE_EMAIL.time():
+        delivery = await services.email.send_batch_email(request.email, mockups)
+    for mockup in mockups:
+        await set_task_status(mockup["task_id"], {
+            "status": "completed",
+            "batch_id": batch_id,
+            "image_url": mockup["image_url"],
+            "derivatives": mockup["derivatives"],
+            "email_sent": delivery["status"] == "sent",
+            "email_delivery": delivery,
+            "upstream": mockup["upstream"],
+            "bytes": mockup["bytes"],
+            "completed_at": datetime.now().isoformat()
+        }, from_statuses=("sending_email",))
+        record_task(mockup["industry"], "completed", mockup["started"])
+
+    logger.info(f"Batch {batch_id} completed: {len(mockups)} mockups")
+
+# Current task record with live queue position when the task is queued on this worker
+async def get_task(task_id: str):
+    task = await task_store.get(task_id)
+    if task is not None and task["status"] == "queued":
+        position = job_scheduler.get_position(task_id)
+        if position is not None:
+            task.update(position)
+    return task
+
+# Wait until task version differs from last_version (any write - status change or new preview),
+# status differs from last_status when given, task finishes or timeout passes.
+# Local changes arrive through pub/sub, changes made by other workers are picked up
+# by re-reading the store every TASK_EVENTS_RECHECK seconds.
+async def wait_for_task_change(
+    task_id: str,
+    last_version: Optional[int],
+    timeout: float,
+    queue: asyncio.Queue,
+    last_status: Optional[str] = None
+):
+    def unchanged(task: dict):
+        return (
+            task.get("version") == last_version
+            and (last_status is None or task["status"] == last_status)
+            and task["status"] not in FINAL_STATUSES
+        )
+
+    task = await get_task(task_id)
+    deadline = time.monotonic() + timeout
+    while task is not None and unchanged(task):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            await asyncio.wait_for(queue.get(), min(remaining, settings.TASK_EVENTS_RECHECK))
+        except asyncio.TimeoutError:
+            pass
+        task = await get_task(task_id)
+    return task
 
 # Task status endpoint
+# With wait > 0 (long-poll) the response is held until the task changes - version differs from
+# last_version (version at request time when not given) or status from last_status -, the task
+# finishes or wait seconds pass.
 @router.get("/task/{task_id}")
-async def get_task_status(task_id: str):
+async def get_task_status(
+    task_id: str,
+    wait: float = Query(0, ge=0, le=settings.TASK_LONG_POLL_MAX),
+    last_status: Optional[str] = None,
+    last_version: Optional[int] = None
+):
     
-    if task_id not in tasks_store:
-        raise HTTPException(
-            status_code=404,
-            detail="Task not found"
-        )
+    with task_events.subscribe(task_id) as queue:
+        task = await get_task(task_id)
+        if task is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Task not found"
+            )
+
+        if wait > 0:
+            if last_version is None:
+                last_version = task.get("version")
+            task = await wait_for_task_change(task_id, last_version, wait, queue, last_status)
+            if task is None:
+                raise HTTPException(status_code=404, detail="Task not found")
     
-    return tasks_store[task_id]
+    return task
+
+# Server-Sent Events stream of task status transitions and previews, closed after completed/failed
+@router.get("/task/{task_id}/events")
+async def task_events_stream(task_id: str):
+    if await task_store.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def stream():
+        with task_events.subscribe(task_id) as queue:
+            last_status = None
+            last_version = None
+            sent_previews = 0
+            while True:
+                task = await wait_for_task_change(task_id, last_version, settings.SSE_KEEPALIVE, queue)
+                if task is None:
+                    return
+                if task.get("version") == last_version and task["status"] == last_status:
+                    # Comment line keeps proxies from closing idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                last_version = task.get("version")
+                # One event per preview added since the last read
+                previews = task.get("previews", [])
+                for index in range(sent_previews, len(previews)):
+                    yield f"event: preview\ndata: {json.dumps({'index': index, 'url': previews[index]})}\n\n"
+                sent_previews = max(sent_previews, len(previews))
+                if task["status"] != last_status:
+                    last_status = task["status"]
+                    yield f"event: status\ndata: {json.dumps(task)}\n\n"
+                    if last_status in FINAL_STATUSES:
+                        return
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Runtime stats endpoint for monitoring (connection pools etc.)
+# Services not loaded yet (lazy startup mode, no traffic so far) are reported as null
+@router.get("/stats")
+async def service_stats():
+    services = loaded_services()
+    openai_service = services.get("openai")
+    email_service = services.get("email")
+    image_service = services.get("image")
+    return {
+        "openai_http_pool": openai_service.get_pool_stats() if openai_service else None,
+        "openai_rate_limiter": openai_service.get_limiter_stats() if openai_service else None,
+        "email_outbox": email_service.get_stats() if email_service else None,
+        "image_workers": image_service.get_stats() if image_service else None,
+        "storage": image_service.get_storage_stats() if image_service else None,
+        "result_cache": result_cache.get_stats(),
+        "brief_index": brief_index.get_stats(),
+        "storage_retention": storage_retention.get_stats(),
+        "quotas": submission_quotas.get_stats(),
+        "warm_pool": warm_pool.get_stats(),
+        "tasks_stored": await task_store.count(),
+        "jobs": job_scheduler.get_stats(),
+        "task_events": task_events.get_stats(),
+        "logging": logging_pipeline.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
 
 # Health check endpoint for monitoring API availability.
 @router.get("/health")
@@ -0,0 +1,71 @@
+import os
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, RedirectResponse, Response
+from starlette.types import Scope
+from services.storage import StorageBackend, CONTENT_HASHED_NAME, IMMUTABLE_CACHE_CONTROL, is_stored_name, shard_relpath
+
+# StaticFiles for /mockups - content-hashed files get immutable caching and strong ETag
+# derived from the name. Conditional (If-None-Match / If-Modified-Since) and Range
+# requests are handled by Starlette's FileResponse.
+# With an object store backend the files are not streamed by the app at all - requests
+# are redirected to the public or presigned object URL.
+class MockupStaticFiles(StaticFiles):
+
+    def __init__(self, *args, storage: StorageBackend = None, index=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = storage
+        # MockupIndex - served files count as accessed for retention
+        self.index = index
+
+    def get_path(self, scope: Scope) -> str:
+        path = super().get_path(scope)
+        # Hidden entries (e.g. result cache under .cache) are never served
+        if any(part.startswith(".") for part in path.split(os.sep) if part):
+            raise HTTPException(status_code=404)
+        return path
+
+    # Flat URL name -> file in its shard. Files not moved into shards yet sit in the top directory.
+    def lookup_path(self, path: str):
+        if is_stored_name(path):
+            full_path, stat_result = super().lookup_path(shard_relpath(path))
+            if stat_result is not None:
+                return full_path, stat_result
+        return super().lookup_path(path)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # Mockups saved before content addressing were never uploaded - served from disk
+        if self.storage is None or not self.storage.redirects or not CONTENT_HASHED_NAME.match(path):
+            return await super().get_response(path, scope)
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        if self.index is not None:
+            self.index.touch(path)
+        return RedirectResponse(
+            self.storage.redirect_url(path),
+            status_code=307,
+            headers={"cache-control": self.storage.redirect_cache_control()}
+        )
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        name = os.path.basename(full_path)
+        if self.index is not None and is_stored_name(name):
+            self.index.touch(name)
+        if not CONTENT_HASHED_NAME.match(name):
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        headers = {
+            "etag": f'"{name}"',
+            "cache-control": IMMUTABLE_CACHE_CONTROL
+        }
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,190 @@
+import re
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+from config import settings
+
+# MinHash signature size and LSH banding - BANDS x ROWS = SIGNATURE_BINS. Keywords sharing all
+# rows of any band are candidates: similarity 0.9 is found with >99% probability, 0.5 with ~40%.
+SIGNATURE_BINS = 32
+BANDS = 8
+ROWS = SIGNATURE_BINS // BANDS
+SHINGLE_LENGTH = 3
+
+MASK64 = (1 << 64) - 1
+# Odd constant spreading values copied into empty bins (densification)
+DENSIFY_STEP = 0x9E3779B97F4A7C15
+
+# Polish letters that don't decompose under NFKD
+TRANSLITERATION = str.maketrans({"ł": "l", "Ł": "L"})
+
+
+# Words of a brief field, lowercase without diacritics and punctuation
+def brief_words(text: Optional[str]):
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.translate(TRANSLITERATION))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+# Canonical keyword - case, punctuation, diacritics and word order don't matter
+def normalize_keyword(keyword: str):
+    return " ".join(sorted(brief_words(keyword)))
+
+# Part of a brief that must match exactly - additional_details in word order ("white text on black"
+# is not "black text on white") and numbers of the keyword (ratings, years, phone numbers)
+def exact_part(keyword: str, additional_details: Optional[str] = None):
+    numbers = " ".join(word for word in brief_words(keyword) if word.isdigit())
+    return numbers + " | " + " ".join(brief_words(additional_details))
+
+# Character shingles of the canonical text, words as whole shingles too
+def _shingles(text: str):
+    shingles = set(text.split())
+    padded = f" {text} "
+    shingles.update(padded[i:i + SHINGLE_LENGTH] for i in range(len(padded) - SHINGLE_LENGTH + 1))
+    return shingles
+
+# One-permutation MinHash: every shingle is hashed once, the hash picks its bin and the minimum
+# per bin is kept. Empty bins borrow from the next filled bin. Agreeing bins estimate Jaccard.
+def signature(text: str):
+    bins = [None] * SIGNATURE_BINS
+    for shingle in _shingles(text):
+        value = hash(shingle) & MASK64
+        index = value % SIGNATURE_BINS
+        value >>= 32
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    for index in range(SIGNATURE_BINS):
+        if bins[index] is None:
+            for distance in range(1, SIGNATURE_BINS):
+                borrowed = bins[(index + distance) % SIGNATURE_BINS]
+                if borrowed is not None:
+                    bins[index] = (((borrowed ^ distance * DENSIFY_STEP) * DENSIFY_STEP) & MASK64) >> 32
+                    break
+    return array("I", bins)
+
+def _band_keys(sig: array):
+    return [hash((band, tuple(sig[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+# Exact Jaccard similarity of the shingle sets
+def similarity(a: str, b: str):
+    a, b = _shingles(a), _shingles(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+# In-memory near-duplicate index of generated briefs, partitioned by industry, output encoding
+# and the exact part of the brief. Maps a new brief to the result cache key of one with a similar
+# keyword, so its stored mockup is reused instead of calling the image API. MinHash / LSH only
+# finds candidates - they match on the exact Jaccard similarity of keyword shingles. Lookup
+# touches only the LSH buckets of the keyword's bands, its cost doesn't grow with the number of
+# entries. Per process, oldest entries beyond BRIEF_INDEX_MAX_ENTRIES are dropped.
+class BriefIndex:
+
+    def __init__(self):
+        self.enabled = settings.BRIEF_INDEX_ENABLED and settings.RESULT_CACHE_ENABLED
+        self.threshold = settings.BRIEF_SIMILARITY_THRESHOLD
+        self.max_entries = settings.BRIEF_INDEX_MAX_ENTRIES
+        # cache key -> (partition, signature, normalized keyword), oldest first
+        self._entries: OrderedDict = OrderedDict()
+        # partition -> band key -> cache key, or list of cache keys on collisions
+        self._buckets: dict = {}
+        self.stats = {"lookups": 0, "matches": 0, "stale": 0, "evictions": 0, "lookup_time_total": 0.0, "lookup_time_max": 0.0}
+
+    @staticmethod
+    def _partition(keyword: str, industry: str, additional_details: Optional[str], output: Optional[dict]):
+        output = output or {}
+        return (
+            industry, output.get("output_format", "png"), output.get("output_compression"),
+            exact_part(keyword, additional_details)
+        )
+
+    # Result cache key of the most similar indexed brief at or above the threshold, or None
+    def find(self, keyword: str, industry: str, additional_details: Optional[str] = None, output: Optional[dict] = None):
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        buckets = self._buckets.get(self._partition(keyword, industry, additional_details, output))
+        best_key, best_similarity = None, self.threshold
+        if buckets:
+            text = normalize_keyword(keyword)
+            seen = set()
+            for band_key in _band_keys(signature(text)):
+                bucket = buckets.get(band_key)
+                if bucket is None:
+                    continue
+                for key in bucket if isinstance(bucket, list) else (bucket,):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    candidate_similarity = similarity(text, self._entries[key][2])
+                    if candidate_similarity >= best_similarity:
+                        best_key, best_similarity = key, candidate_similarity
+
+        elapsed = time.perf_counter() - started
+        self.stats["lookups"] += 1
+        self.stats["lookup_time_total"] += elapsed
+        self.stats["lookup_time_max"] = max(self.stats["lookup_time_max"], elapsed)
+        if best_key is not None:
+            self.stats["matches"] += 1
+        return best_key
+
+    # Index brief whose mockup is stored in the result cache under cache_key
+    def add(self, cache_key: str, keyword: str, industry: str, additional_details: Optional[str] = None, output: Optional[dict] = None):
+        if not self.enabled or cache_key in self._entries:
+            return
+        partition = self._partition(keyword, industry, additional_details, output)
+        text = normalize_keyword(keyword)
+        sig = signature(text)
+        buckets = self._buckets.setdefault(partition, {})
+        for band_key in _band_keys(sig):
+            bucket = buckets.get(band_key)
+            if bucket is None:
+                buckets[band_key] = cache_key
+            elif isinstance(bucket, list):
+                bucket.append(cache_key)
+            else:
+                buckets[band_key] = [bucket, cache_key]
+        self._entries[cache_key] = (partition, sig, text)
+
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    # Drop entry - its mockup is no longer in the result cache
+    def remove(self, cache_key: str, stale: bool = False):
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        if stale:
+            self.stats["stale"] += 1
+        partition, sig, _ = entry
+        buckets = self._buckets[partition]
+        for band_key in _band_keys(sig):
+            bucket = buckets.get(band_key)
+            if isinstance(bucket, list):
+                bucket.remove(cache_key)
+                if len(bucket) == 1:
+                    buckets[band_key] = bucket[0]
+            elif bucket == cache_key:
+                del buckets[band_key]
+        if not buckets:
+            del self._buckets[partition]
+
+    def get_stats(self):
+        lookups = self.stats["lookups"] or 1
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "partitions": len(self._buckets),
+            "threshold": self.threshold,
+            "lookups": self.stats["lookups"],
+            "matches": self.stats["matches"],
+            "stale": self.stats["stale"],
+            "evictions": self.stats["evictions"],
+            "lookup_us_avg": round(self.stats["lookup_time_total"] / lookups * 1e6, 1),
+            "lookup_us_max": round(self.stats["lookup_time_max"] * 1e6, 1)
+        }
+
+brief_index = BriefIndex()
@@ -1,14 +1,236 @@
 import aiosmtplib
+import asyncio
 import logging
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Optional
+from typing import Optional, Union
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Errors that will not go away on retry - the relay refused sender or recipient
+PERMANENT_SMTP_ERRORS = (
+    aiosmtplib.SMTPRecipientsRefused,
+    aiosmtplib.SMTPSenderRefused,
+)
+
+
+# Pool of authenticated SMTP sessions reused between sends
+class SMTPSessionPool:
+
+    def __init__(self, size: int, max_idle: float):
+        self.size = size
+        self.max_idle = max_idle
+        # Idle sessions as (smtp, last_used) pairs
+        self._idle: list = []
+        self._slots = asyncio.Semaphore(size)
+        self.stats = {"logins": 0, "reused": 0, "discarded": 0}
+
+    # Open new connection, TLS handshake and login
+    async def _connect(self):
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_SERVER,
+            port=settings.SMTP_PORT,
+            use_tls=settings.SMTP_USE_TLS
+        )
+        await smtp.connect()
+        await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        self.stats["logins"] += 1
+        return smtp
+
+    # Check if idle session is still usable - relays drop idle connections
+    async def _is_healthy(self, smtp, last_used: float):
+        if not smtp.is_connected:
+            return False
+        if time.monotonic() - last_used < self.max_idle:
+            return True
+        try:
+            await smtp.noop()
+            return True
+        except aiosmtplib.SMTPException:
+            return False
+
+    # Take healthy idle session or log in a new one (waits when pool is exhausted)
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                smtp, last_used = self._idle.pop()
+                if await self._is_healthy(smtp, last_used):
+                    self.stats["reused"] += 1
+                    return smtp
+                self._discard(smtp)
+            return await self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    # Return session to the pool, broken sessions are dropped
+    def release(self, smtp, broken: bool = False):
+        if broken or not smtp.is_connected:
+            self._discard(smtp)
+        else:
+            self._idle.append((smtp, time.monotonic()))
+        self._slots.release()
+
+    def _discard(self, smtp):
+        self.stats["discarded"] += 1
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    # Politely close all idle sessions
+    async def close(self):
+        while self._idle:
+            smtp, _ = self._idle.pop()
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "idle": len(self._idle),
+            "size": self.size
+        }
+
+
+# Single message waiting in outbox with its retry state
+class OutboxItem:
+
+    def __init__(self, message: MIMEMultipart, recipient: str):
+        self.message = message
+        self.recipient = recipient
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.future = asyncio.get_running_loop().create_future()
+
+
+# Outbox with its own concurrency limit - messages queued close together go out in one session
+class EmailOutbox:
+
+    def __init__(self, pool: SMTPSessionPool):
+        self.pool = pool
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: list = []
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "batches": 0}
+
+    def start(self):
+        if self.workers:
+            return
+        self.queue = asyncio.Queue()
+        self.workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(settings.SMTP_OUTBOX_CONCURRENCY)
+        ]
+        logger.info(f"Email outbox started with {len(self.workers)} workers")
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        await self.pool.close()
+
+    # Queue message and wait for its delivery status
+    async def submit(self, message: MIMEMultipart, recipient: str):
+        if not self.workers:
+            self.start()
+        item = OutboxItem(message, recipient)
+        self.queue.put_nowait(item)
+        return await item.future
+
+    # Collect first message and everything that arrives within batch window
+    async def _collect_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + settings.SMTP_BATCH_WINDOW
+        while len(batch) < settings.SMTP_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self, worker_id: int):
+        while True:
+            batch = await self._collect_batch()
+            self.stats["batches"] += 1
+            await self._send_batch(batch)
+
+    # Send whole batch over one pooled session
+    async def _send_batch(self, batch: list):
+        try:
+            smtp = await self.pool.acquire()
+        except Exception as e:
+            logger.error(f"SMTP connection failed: {str(e)}")
+            for item in batch:
+                item.attempts += 1
+                self._retry_or_fail(item, e, len(batch))
+            return
+
+        broken = False
+        for item in batch:
+            if broken:
+                # Session died mid-batch - remaining messages go back to the queue without penalty
+                self.queue.put_nowait(item)
+                continue
+            item.attempts += 1
+            try:
+                await smtp.send_message(item.message)
+                self.stats["sent"] += 1
+                logger.info(f"Email sent successfully to: {item.recipient}")
+                self._resolve(item, "sent", len(batch))
+            except PERMANENT_SMTP_ERRORS as e:
+                self._fail(item, e, len(batch))
+            except Exception as e:
+                broken = isinstance(e, (aiosmtplib.SMTPServerDisconnected, ConnectionError, OSError))
+                self._retry_or_fail(item, e, len(batch))
+        self.pool.release(smtp, broken=broken)
+
+    # Re-queue message with exponential backoff or mark it failed when retries run out
+    def _retry_or_fail(self, item: OutboxItem, error: Exception, batch_size: int):
+        if item.attempts > settings.SMTP_SEND_RETRIES:
+            self._fail(item, error, batch_size)
+            return
+        self.stats["retried"] += 1
+        delay = settings.SMTP_RETRY_BACKOFF * (2 ** (item.attempts - 1))
+        item.error = str(error)
+        logger.warning(f"Email to {item.recipient} failed (attempt {item.attempts}), retrying in {delay}s: {str(error)}")
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, item)
+
+    def _fail(self, item: OutboxItem, error: Exception, batch_size: int):
+        self.stats["failed"] += 1
+        item.error = str(error)
+        logger.error(f"Failed to send email to {item.recipient}: {str(error)}")
+        self._resolve(item, "failed", batch_size)
+
+    def _resolve(self, item: OutboxItem, status: str, batch_size: int):
+        if item.future.done():
+            return
+        item.future.set_result({
+            "status": status,
+            "attempts": item.attempts,
+            "batch_size": batch_size,
+            "error": item.error if status == "failed" else None
+        })
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "workers": len(self.workers),
+            "smtp_pool": self.pool.get_stats()
+        }
+
+
 # Service for sending emails with mockup attachments via SMTP"
 class EmailService:
 
@@ -19,14 +241,35 @@ class EmailService:
         self.smtp_password = settings.SMTP_PASSWORD
         self.sender_email = settings.SENDER_EMAIL
         self.smtp_port = settings.SMTP_PORT
+        self.outbox = EmailOutbox(
+            SMTPSessionPool(settings.SMTP_POOL_SIZE, settings.SMTP_SESSION_MAX_IDLE)
+        )
+
+    # Start outbox workers (called from app lifespan)
+    async def start(self):
+        self.outbox.start()
+
+    # Stop outbox workers and close pooled SMTP sessions
+    async def close(self):
+        await self.outbox.close()
+
+    def get_stats(self):
+        return self.outbox.get_stats()
 
-    async def send_mockup_email(self, recipient_email: str, image_data: bytes, image_filename: str, keyword: str, industry: str):
-        # Send email with generated mockup image as attachment
+    # Send email with generated mockup image as attachment.
+    # With full_image_url the attachment can be a small preview - the email links to the full file.
+    # Returns delivery status dict: status ('sent'/'failed'), attempts, batch_size, error
+    async def send_mockup_email(self, recipient_email: str, image_data: Union[bytes, memoryview], image_filename: str, keyword: str, industry: str, full_image_url: Optional[str] = None):
         message = MIMEMultipart("alternative")
         message["Subject"] = f"PixelDuetWeb: Generator wizualizacji stron AI | '{keyword}'"
         message["From"] = self.sender_email
         message["To"] = recipient_email
-        
+
+        full_image_link = (
+            f'<p><a href="{full_image_url}">Download full resolution mockup</a></p>'
+            if full_image_url else ""
+        )
+
         # HTML body
         html = f"""
                 <html>
@@ -39,10 +282,11 @@ class EmailService:
                                     <li><strong>Industry:</strong> {industry}</li>
                                     <li><strong>Generated:</strong> Just now</li>
                                 </ul>
-                                
+
                                 <h3>Your Mockup Preview:</h3>
                                 <img src="cid:{image_filename}" alt="Website Mockup" style="max-width: 100%; height: auto;">
-                                
+                                {full_image_link}
+
                                 <p>Best regards,<br>
                                 Mockup Generator Team</p>
                             </body>
@@ -52,8 +296,51 @@ class EmailService:
         # Attach HTML content
         part = MIMEText(html, "html")
         message.attach(part)
-        
+
         # Attach image file
+        self._attach_image(message, image_data, image_filename)
+
+        return await self._submit(message, recipient_email)
+
+    # Send one email with all variants of a batch request.
+    # mockups: list of dicts with keyword, industry, image_data, image_filename, image_url
+    async def send_batch_email(self, recipient_email: str, mockups: list):
+        message = MIMEMultipart("alternative")
+        message["Subject"] = f"PixelDuetWeb: Generator wizualizacji stron AI | {len(mockups)} mockups"
+        message["From"] = self.sender_email
+        message["To"] = recipient_email
+
+        items = "".join(
+            f"""
+                                    <li><strong>{mockup['keyword']}</strong> ({mockup['industry']}) -
+                                        <a href="{mockup['image_url']}">download full resolution</a></li>"""
+            for mockup in mockups
+        )
+
+        # HTML body
+        html = f"""
+                <html>
+                            <body>
+                                <h2>Your Website Mockups</h2>
+                                <p>Hello,</p>
+                                <p>We've generated {len(mockups)} website mockups based on your request:</p>
+                                <ul>{items}
+                                </ul>
+                                <p>Previews are attached to this email.</p>
+
+                                <p>Best regards,<br>
+                                Mockup Generator Team</p>
+                            </body>
+                        </html>
+                """
+        message.attach(MIMEText(html, "html"))
+
+        for mockup in mockups:
+            self._attach_image(message, mockup["image_data"], mockup["image_filename"])
+
+        return await self._submit(message, recipient_email)
+
+    def _attach_image(self, message: MIMEMultipart, image_data: Union[bytes, memoryview], image_filename: str):
         part = MIMEBase("application", "octet-stream")
         part.set_payload(image_data)
         encoders.encode_base64(part)
@@ -62,21 +349,13 @@ class EmailService:
             f"attachment; filename= {image_filename}"
         )
         message.attach(part)
-        
+
+    # Hand message to the outbox and wait for delivery status
+    async def _submit(self, message: MIMEMultipart, recipient_email: str):
         try:
-            async with aiosmtplib.SMTP(
-                hostname=self.smtp_server,
-                port=self.smtp_port,
-                use_tls=True
-            ) as smtp:
-                await smtp.login(self.smtp_user, self.smtp_password)
-                await smtp.send_message(message)
-            
-            logger.info(f"Email sent successfully to: {recipient_email}")
-            return True
-            
+            return await self.outbox.submit(message, recipient_email)
         except Exception as e:
             logger.error(f"Failed to send email to {recipient_email}: {str(e)}")
-            return False
+            return {"status": "failed", "attempts": 0, "batch_size": 0, "error": str(e)}
 
-email_service = EmailService()
\ No newline at end of file
+email_service = EmailService()
@@ -1,64 +1,447 @@
+import asyncio
 import base64
+import hashlib
+import multiprocessing
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
 import logging
-from PIL import Image
+import io
+import mmap
 from io import BytesIO
+from typing import Optional, Union
 from config import settings
+from services.storage import storage, shard_path, CONTENT_HASH_LENGTH, FILENAME_PREFIX
+from services.storage_retention import mockup_index
 
 logger = logging.getLogger(__name__)
 
+
+# Blocking Pillow/disk work - module level functions so they can run in a process pool too.
+# Pillow is imported inside the functions that need it, importing this module stays cheap.
+
+
+# Read-only file object over any buffer (bytes, memoryview, mmap) without copying it
+class BufferReader(io.RawIOBase):
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        chunk = self._view[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+# File object for Pillow - BytesIO over bytes shares the buffer, other buffers get a zero-copy reader
+def _open_buffer(data):
+    if isinstance(data, bytes):
+        return BytesIO(data)
+    return io.BufferedReader(BufferReader(data))
+
+# Parse image header only - returns (format, width, height)
+def probe_image(data: bytes):
+    from PIL import Image
+    with Image.open(_open_buffer(data)) as image:
+        return (image.format or "").lower(), image.size[0], image.size[1]
+
+# Format names that refer to the same encoding
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+# File extensions that differ from the format name
+FILE_EXTENSIONS = {"jpeg": "jpg"}
+
+def _same_format(a: str, b: str):
+    return FORMAT_ALIASES.get(a.lower(), a.lower()) == FORMAT_ALIASES.get(b.lower(), b.lower())
+
+# Decode image and encode it to target format
+def encode_image(data: bytes, format: str):
+    from PIL import Image
+    with Image.open(_open_buffer(data)) as image:
+        if format.lower() == "png":
+            return _encode(image, "PNG", None)
+        if format.lower() == "webp":
+            return _encode(image, "WEBP", 95)
+        return _encode(image.convert("RGB"), "JPEG", 95)
+
+# Write bytes via temp file + rename - files are served as immutable, so never expose partial writes
+def write_bytes(data: bytes, file_path: str):
+    tmp_path = f"{file_path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+# Content-addressed save - file is named by hash of its bytes, identical images are stored once.
+# Returns (filename, deduplicated)
+def store_image(data: bytes, storage_dir: str, source_format: str, format: str):
+    # Already in requested format - keep bytes as they are, no re-encoding
+    content = data if _same_format(source_format, format) else encode_image(data, format)
+    digest = hashlib.sha256(content).hexdigest()[:CONTENT_HASH_LENGTH]
+    format = FORMAT_ALIASES.get(format.lower(), format.lower())
+    filename = f"{FILENAME_PREFIX}{digest}.{FILE_EXTENSIONS.get(format, format)}"
+    file_path = shard_path(storage_dir, filename)
+    if file_path.exists():
+        return filename, True
+    file_path.parent.mkdir(exist_ok=True)
+    write_bytes(content, str(file_path))
+    return filename, False
+
+# Encode image to bytes in given Pillow format
+def _encode(image: "Image.Image", format: str, quality: Optional[int]):
+    buffer = BytesIO()
+    if quality is None:
+        image.save(buffer, format, optimize=True)
+    else:
+        image.save(buffer, format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+# Smallest JPEG of the image that fits into max_bytes - lowers quality first, then width
+def _fit_jpeg(image: "Image.Image", width: int, max_bytes: int):
+    while True:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        for quality in (85, 75, 65, 55, 45):
+            encoded = _encode(resized, "JPEG", quality)
+            if len(encoded) <= max_bytes:
+                return encoded
+        if width <= 200:
+            return encoded
+        width = int(width * 0.8)
+
+# Decode original once and write all derivatives next to it:
+# thumbnail, compressed web variant and size-capped email preview.
+# An original already stored in the web format serves as its own web variant.
+# Returns {name: filename} plus email preview bytes.
+def make_derivatives(data: bytes, file_path: str, spec: dict):
+    path = Path(file_path)
+    web_format = spec["web_format"]
+    web_extension = "webp" if web_format == "WEBP" else "jpg"
+    filenames = {
+        "thumbnail": f"{path.stem}_thumb.{web_extension}",
+        "web": f"{path.stem}.{web_extension}",
+        "email_preview": f"{path.stem}_email.jpg"
+    }
+
+    # Content-hashed original - derivatives from an earlier identical image are reused
+    email_preview_path = path.with_name(filenames["email_preview"])
+    if all(path.with_name(filename).exists() for filename in filenames.values()):
+        return filenames, email_preview_path.read_bytes()
+
+    from PIL import Image
+    with Image.open(_open_buffer(data)) as image:
+        image = image.convert("RGB")
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((spec["thumbnail_width"], spec["thumbnail_width"] * 4))
+    write_bytes(_encode(thumbnail, web_format, spec["web_quality"]), str(path.with_name(filenames["thumbnail"])))
+    if filenames["web"] != path.name:
+        write_bytes(_encode(image, web_format, spec["web_quality"]), str(path.with_name(filenames["web"])))
+
+    email_preview = _fit_jpeg(image, spec["email_preview_width"], spec["email_preview_max_bytes"])
+    write_bytes(email_preview, str(email_preview_path))
+    return filenames, email_preview
+
+# Low-resolution preview of a partial image streamed during generation, stored like a
+# derivative under a hash of the preview bytes (mockup_<hash>_partial.<ext>). Returns filename.
+def make_preview(data: bytes, storage_dir: str, spec: dict):
+    from PIL import Image
+    with Image.open(_open_buffer(data)) as image:
+        image = image.convert("RGB")
+    image.thumbnail((spec["width"], spec["width"] * 4))
+    content = _encode(image, spec["web_format"], spec["web_quality"])
+    digest = hashlib.sha256(content).hexdigest()[:CONTENT_HASH_LENGTH]
+    extension = "webp" if spec["web_format"] == "WEBP" else "jpg"
+    filename = f"{FILENAME_PREFIX}{digest}_partial.{extension}"
+    file_path = shard_path(storage_dir, filename)
+    if not file_path.exists():
+        file_path.parent.mkdir(exist_ok=True)
+        write_bytes(content, str(file_path))
+    return filename
+
+# Wrapper executed inside the worker - reports when the job actually started and how long it ran
+def _timed_call(fn, *args):
+    started = time.monotonic()
+    result = fn(*args)
+    return started, time.monotonic() - started, result
+
+
+# Bounded thread/process pool for image processing, keeps Pillow work off the event loop
+class ImageWorkerPool:
+
+    def __init__(self, mode: str, workers: int, queue_size: int):
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = None
+        # Jobs running + waiting - callers await a free slot when the queue is full
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._pending = 0
+        self.stats = {
+            "jobs": 0,
+            "failed": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+            "exec_total": 0.0,
+            "exec_max": 0.0
+        }
+
+    def start(self):
+        if self.executor is not None:
+            return
+        if self.mode == "process":
+            # spawn - forking a process with running event loop threads is unsafe
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="image-worker"
+            )
+        logger.info(f"Image worker pool started ({self.mode}, workers={self.workers}, queue={self.queue_size})")
+
+    def close(self):
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        logger.info("Image worker pool closed")
+
+    # Run blocking function in the pool and await its result
+    async def run(self, fn, *args):
+        if self.executor is None:
+            self.start()
+
+        # Memory-mapped / view buffers can't be pickled to another process
+        if self.mode == "process":
+            args = tuple(bytes(arg) if isinstance(arg, (memoryview, mmap.mmap)) else arg for arg in args)
+
+        submitted = time.monotonic()
+        self._pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                started, exec_time, result = await loop.run_in_executor(
+                    self.executor, _timed_call, fn, *args
+                )
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        queue_wait = max(0.0, started - submitted)
+        self.stats["jobs"] += 1
+        self.stats["queue_wait_total"] += queue_wait
+        self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], queue_wait)
+        self.stats["exec_total"] += exec_time
+        self.stats["exec_max"] = max(self.stats["exec_max"], exec_time)
+        return result
+
+    def get_stats(self):
+        jobs = self.stats["jobs"] or 1
+        return {
+            **self.stats,
+            "queue_wait_avg": self.stats["queue_wait_total"] / jobs,
+            "exec_avg": self.stats["exec_total"] / jobs,
+            "pending": self._pending,
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_size": self.queue_size
+        }
+
+
+# Decoded image passed through the whole pipeline (validation, storage, email).
+# Base64 is decoded exactly once, raw bytes are shared as memoryview and
+# the parsed header (format, dimensions) is cached after first access.
+class ImageArtifact:
+
+    # data: bytes, or mmap of a spooled temp file for streamed responses
+    def __init__(self, data: Union[bytes, mmap.mmap]):
+        self.data = data
+        self.buffer = memoryview(data)
+        # (format, width, height) - filled by ImageService.probe
+        self.header: Optional[tuple] = None
+
+    @classmethod
+    def from_b64(cls, image_b64: str):
+        return cls(base64.b64decode(image_b64))
+
+    @property
+    def size_bytes(self):
+        return self.buffer.nbytes
+
+    # Header parsed in place if nobody probed it in the worker pool yet
+    def _get_header(self):
+        if self.header is None:
+            self.header = probe_image(self.data)
+        return self.header
+
+    @property
+    def format(self):
+        return self._get_header()[0]
+
+    @property
+    def width(self):
+        return self._get_header()[1]
+
+    @property
+    def height(self):
+        return self._get_header()[2]
+
+
 # Service for processing, validating, and storing base64-encoded images
 class ImageService:
 
-    # Initialize image service and create storage directory if needed
+    # Initialize image service - IMAGE_STORAGE_PATH holds every stored file, the storage
+    # backend (services/storage.py) makes them available to all nodes
     def __init__(self):
         self.storage_path = Path(settings.IMAGE_STORAGE_PATH)
+        self.storage = storage
+        self.index = mockup_index
+        self.workers = ImageWorkerPool(
+            settings.IMAGE_WORKER_MODE,
+            settings.IMAGE_WORKERS,
+            settings.IMAGE_QUEUE_SIZE
+        )
+
+    # Create storage directory, start storage backend and worker pool (app lifespan or first use)
+    async def start(self):
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        await self.storage.start()
+        self.workers.start()
 
-    # Decode base64 image, save to disk with timestamped filename
-    def save_image(self, image_b64: str, keyword: str, format: str = "png"):
-    
-        # Decode base64 to image bytes
-        image_data = base64.b64decode(image_b64)
+    async def close(self):
+        self.workers.close()
+        await self.storage.close()
 
-        # Open image from bytes
-        image = Image.open(BytesIO(image_data))
+    def get_storage_stats(self):
+        return self.storage.get_stats()
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def get_stats(self):
+        return self.workers.get_stats()
 
-        # Sanitize keyword - keep only alphanumeric and underscores
-        safe_keyword = "".join(c for c in keyword if c.isalnum() or c == "_")[:30]
-        filename = f"mockup_{safe_keyword}_{timestamp}.{format}"
+    # Parse artifact header in the worker pool and cache it on the artifact
+    async def probe(self, image: ImageArtifact):
+        if image.header is None:
+            image.header = await self.workers.run(probe_image, image.data)
+        return image.header
 
-        file_path = self.storage_path / filename
+    # Run storing job in the worker pool and index the files it returns. A job reusing a stored
+    # file can race an eviction sweep - when a file is gone by the time it is indexed, the job
+    # runs again and writes it anew, so no URL is handed out for an evicted file.
+    async def _store(self, paths, fn, *args):
+        result = await self.workers.run(fn, *args)
+        if await self.index.record(paths(result)):
+            result = await self.workers.run(fn, *args)
+            await self.index.record(paths(result))
+        return result
+
+    # Save decoded image to disk under content-hash filename (identical images share one file)
+    # and upload it to the storage backend before its URL is handed out.
+    # Without format the image is stored in the encoding it came in, byte for byte.
+    async def save_image(self, image: Union[ImageArtifact, str], format: Optional[str] = None):
+
+        # Accept raw base64 for callers that don't hold an artifact yet
+        if isinstance(image, str):
+            image = ImageArtifact.from_b64(image)
 
         try:
-            # Save image with high quality
-            if format.lower() == "png":
-                image.save(file_path,"PNG", quality=99)
-            else:
-                image.save(file_path, "JPG", quality=99)
+            source_format, _, _ = await self.probe(image)
+            filename, deduplicated = await self._store(
+                lambda result: [str(shard_path(str(self.storage_path), result[0]))],
+                store_image, image.data, str(self.storage_path), source_format, format or source_format
+            )
 
-            file_url = f"{settings.API_URL}/mockups/{filename}"
+            file_path = shard_path(str(self.storage_path), filename)
+            await self.storage.put(filename, str(file_path))
+            file_url = self.storage.url(filename)
 
-            logger.info(f"Image saved: {file_path}")
+            if deduplicated:
+                logger.info(f"Image already stored: {file_path}")
+            else:
+                logger.info(f"Image saved: {file_path}")
             return str(file_path), file_url
 
         except Exception as e:
             logger.error(f"Failed save: {str(e)}")
             raise
 
-    # Validate base64 image data - check if it's decodable and has valid dimensions.
-    def validate_image_data(self,image_b64: str):
+    # Generate thumbnail, compressed web variant and email preview for a saved image.
+    # Returns ({name: url}, email_preview_bytes) or (empty dict, None) when disabled.
+    async def create_derivatives(self, image: ImageArtifact, file_path: str):
+        if not settings.DERIVATIVES_ENABLED:
+            return {}, None
+
+        spec = {
+            "web_format": "WEBP" if settings.WEB_IMAGE_FORMAT.lower() == "webp" else "JPEG",
+            "web_quality": settings.WEB_IMAGE_QUALITY,
+            "thumbnail_width": settings.THUMBNAIL_WIDTH,
+            "email_preview_width": settings.EMAIL_PREVIEW_WIDTH,
+            "email_preview_max_bytes": settings.EMAIL_PREVIEW_MAX_KB * 1024
+        }
         try:
-            image_data = base64.b64decode(image_b64)
-            image = Image.open(BytesIO(image_data))
-                               
-            return image.size[0] > 0 and image.size[1] > 0
+            filenames, email_preview = await self._store(
+                lambda result: [str(Path(file_path).with_name(filename)) for filename in result[0].values()],
+                make_derivatives, image.data, file_path, spec
+            )
+            await asyncio.gather(*(
+                self.storage.put(filename, str(Path(file_path).with_name(filename)))
+                for filename in filenames.values()
+            ))
+        except Exception as e:
+            # Derivatives are optional - the full image is already stored
+            logger.error(f"Failed to create derivatives for {file_path}: {str(e)}")
+            return {}, None
+
+        urls = {name: self.storage.url(filename) for name, filename in filenames.items()}
+        return urls, email_preview
+
+    # Save partial image as a low-resolution preview in the web format - returns its URL
+    async def save_preview(self, image_data: bytes):
+        spec = {
+            "web_format": "WEBP" if settings.WEB_IMAGE_FORMAT.lower() == "webp" else "JPEG",
+            "web_quality": settings.WEB_IMAGE_QUALITY,
+            "width": settings.PREVIEW_WIDTH
+        }
+        filename = await self._store(
+            lambda result: [str(shard_path(str(self.storage_path), result))],
+            make_preview, image_data, str(self.storage_path), spec
+        )
+        file_path = shard_path(str(self.storage_path), filename)
+        await self.storage.put(filename, str(file_path))
+        return self.storage.url(filename)
+
+    # Validate image data - check if it's decodable and has valid dimensions.
+    async def validate_image_data(self, image: Union[ImageArtifact, str]):
+        try:
+            if isinstance(image, str):
+                image = ImageArtifact.from_b64(image)
+
+            _, width, height = await self.probe(image)
+            return width > 0 and height > 0
 
         except Exception as e:
             return False
 
-image_service = ImageService()
\ No newline at end of file
+image_service = ImageService()
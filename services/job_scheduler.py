@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Optional
+from config import settings
+from logging_setup import task_log_context
+
+logger = logging.getLogger(__name__)
+
+
+# Raised when the queue is full - caller should answer 503 with Retry-After
+class QueueFullError(Exception):
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+# Single queued job
+class Job:
+
+    def __init__(self, job_id: str, fn, args: tuple, priority: int, on_drop=None):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        # Awaited when the job is dropped or cancelled on shutdown
+        self.on_drop = on_drop
+        self.enqueued_at = time.monotonic()
+
+
+# Bounded priority job scheduler with fixed number of workers and admission control.
+# Lower priority value runs first, equal priorities run in FIFO order.
+class JobScheduler:
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._seq = itertools.count()
+        # job_id -> (priority, seq) for jobs waiting in the queue
+        self._pending: dict = {}
+        self._running = 0
+        self._accepting = False
+        # Moving average of job duration, used for wait estimates
+        self._avg_duration = settings.JOB_DEFAULT_DURATION
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "dropped": 0}
+
+    def start(self):
+        if self._workers:
+            return
+        self.queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job scheduler started (workers={self.workers}, queue={self.queue_size})")
+
+    # Stop accepting jobs, let in-flight and queued jobs finish within timeout, drop/cancel the rest
+    async def close(self, timeout: float):
+        if not self._workers:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Job scheduler drain timed out, {self._running} running, {len(self._pending)} queued")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        while not self.queue.empty():
+            _, _, job = self.queue.get_nowait()
+            await self._drop(job)
+        logger.info("Job scheduler stopped")
+
+    def is_full(self):
+        return not self._accepting or self.queue is None or self.queue.full()
+
+    # Raise QueueFullError when a new job can't be accepted
+    def check_admission(self):
+        if self.queue is None:
+            self.start()
+        if self.is_full():
+            self.stats["rejected"] += 1
+            raise QueueFullError(self.retry_after())
+
+    # Seconds a new job would wait - used for Retry-After
+    def retry_after(self):
+        return max(1, math.ceil(self._estimate_wait(self.queue_size + 1)))
+
+    # Enqueue job or raise QueueFullError. Returns queue position info.
+    def submit(self, job_id: str, fn, *args, priority: int = 0, on_drop=None):
+        self.check_admission()
+
+        seq = next(self._seq)
+        self.queue.put_nowait((priority, seq, Job(job_id, fn, args, priority, on_drop)))
+        self._pending[job_id] = (priority, seq)
+        self.stats["submitted"] += 1
+        return self.get_position(job_id)
+
+    # Position in queue (1 = next to run) and estimated wait in seconds, None when not queued here
+    def get_position(self, job_id: str):
+        key = self._pending.get(job_id)
+        if key is None:
+            return None
+        position = 1 + sum(1 for other in self._pending.values() if other < key)
+        return {
+            "queue_position": position,
+            "estimated_wait": round(self._estimate_wait(position), 1)
+        }
+
+    # Jobs ahead are spread over all workers, each round takes about one average job duration
+    def _estimate_wait(self, position: int):
+        busy = self._running >= self.workers
+        rounds = (position - 1) // self.workers + (1 if busy else 0)
+        return rounds * self._avg_duration
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            self._pending.pop(job.job_id, None)
+            self._running += 1
+            started = time.monotonic()
+            try:
+                # Job id (task or batch id) is attached to every log record of the job
+                with task_log_context(job.job_id):
+                    await job.fn(*job.args)
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                # Cancelled after drain timeout - let the job record its failure
+                await self._drop(job)
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Job {job.job_id} failed: {str(e)}")
+            finally:
+                self._running -= 1
+                duration = time.monotonic() - started
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+                self.queue.task_done()
+
+    async def _drop(self, job: Job):
+        self._pending.pop(job.job_id, None)
+        self.stats["dropped"] += 1
+        if job.on_drop is not None:
+            try:
+                await job.on_drop(job.job_id)
+            except Exception as e:
+                logger.error(f"Failed to drop job {job.job_id}: {str(e)}")
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "queued": len(self._pending),
+            "running": self._running,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "avg_duration": round(self._avg_duration, 2)
+        }
+
+job_scheduler = JobScheduler(settings.JOB_WORKERS, settings.JOB_QUEUE_SIZE)
@@ -0,0 +1,279 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Default histogram buckets (seconds) - sub-millisecond CPU stages up to slow image generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: Optional[tuple] = None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Minimal in-process metrics in Prometheus text format.
+# Everything runs on the event loop, so updates are plain dict/list operations without locks.
+# Label children are cached - hot paths should keep the child returned by labels().
+class Metric:
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        # Metric without labels has exactly one child
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: tuple, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+
+    def __init__(self):
+        self.value = 0.0
+        # Read at scrape time instead of stored value
+        self.function = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function):
+        self.function = function
+
+
+class Gauge(Metric):
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _render_child(self, key: tuple, child):
+        value = child.function() if child.function is not None else child.value
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # Non-cumulative counts, last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    # Observe duration of the block in seconds
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(Metric):
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, key: tuple, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# Set of metrics rendered together on /metrics
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: dict = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Mockup pipeline metrics (per process)
+STAGE_DURATION = registry.histogram(
+    "mockup_stage_duration_seconds",
+    "Duration of mockup pipeline stages",
+    ("stage",)
+)
+TASK_DURATION = registry.histogram(
+    "mockup_task_duration_seconds",
+    "Duration of mockup tasks from start of processing to completion or failure",
+    ("status",)
+)
+FIRST_PREVIEW = registry.histogram(
+    "mockup_first_preview_seconds",
+    "Time from start of processing to the first partial-image preview of a task"
+)
+TASKS_TOTAL = registry.counter(
+    "mockup_tasks_total",
+    "Finished mockup tasks by industry and final status",
+    ("industry", "status")
+)
+TASKS_IN_FLIGHT = registry.gauge(
+    "mockup_tasks_in_flight",
+    "Mockup tasks currently being processed"
+)
+TASKS_STORED = registry.gauge(
+    "mockup_tasks_stored",
+    "Task records held in the task store"
+)
+STORAGE_FILES = registry.gauge(
+    "mockup_storage_files",
+    "Files in IMAGE_STORAGE_PATH according to the storage index"
+)
+STORAGE_BYTES = registry.gauge(
+    "mockup_storage_bytes",
+    "Bytes in IMAGE_STORAGE_PATH according to the storage index"
+)
+WARM_POOL_REQUESTS = registry.counter(
+    "mockup_warm_pool_requests_total",
+    "Eligible generic requests by warm pool result (hit, miss)",
+    ("result",)
+)
+WARM_POOL_GENERATIONS = registry.counter(
+    "mockup_warm_pool_generations_total",
+    "Warm pool refill generations by status (generated, failed)",
+    ("status",)
+)
+QUOTA_REJECTED = registry.counter(
+    "mockup_quota_rejected_total",
+    "Submissions rejected by the per-email / per-IP quotas, by scope",
+    ("scope",)
+)
+STORAGE_EVICTED = registry.counter(
+    "mockup_storage_evicted_files_total",
+    "Files removed from IMAGE_STORAGE_PATH by retention, by reason (age, quota)",
+    ("reason",)
+)
+STORAGE_RECLAIMED = registry.counter(
+    "mockup_storage_reclaimed_bytes_total",
+    "Bytes reclaimed in IMAGE_STORAGE_PATH by retention, by reason (age, quota)",
+    ("reason",)
+)
+
+# Stage children resolved once - observing is a bisect and two additions
+STAGE_PROMPT_BUILD = STAGE_DURATION.labels(stage="prompt_build")
+STAGE_UPSTREAM = STAGE_DURATION.labels(stage="upstream")
+STAGE_VALIDATION = STAGE_DURATION.labels(stage="validation")
+STAGE_SAVE = STAGE_DURATION.labels(stage="save")
+STAGE_DERIVATIVES = STAGE_DURATION.labels(stage="derivatives")
+STAGE_EMAIL = STAGE_DURATION.labels(stage="email")
@@ -1,12 +1,20 @@
-import openai
 import httpx
+import asyncio
 import logging
 import base64
+import json
+import time
 from config import settings
 from typing import Optional
+from services.rate_limiter import upstream_limiter, parse_retry_after, backoff_delay
+from services.stream_decoder import B64JsonStreamDecoder
+from services.metrics import STAGE_PROMPT_BUILD, STAGE_UPSTREAM
 
 logger = logging.getLogger(__name__)
 
+# Upstream statuses worth retrying - rate limit and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
 # Service for generating website mockups using OpenAI API
 class OpenAIService:
 
@@ -15,8 +23,59 @@ class OpenAIService:
         
         self.api_key = settings.OPENAI_API_KEY
         self.model = settings.OPENAI_MODEL
-        self.api_url = "https://api.openai.com/v1/images/generations"
+        self.api_url = settings.OPENAI_API_URL
         self.timeout = settings.REQUEST_TIMEOUT
+        # Shared pooled client - created on app startup, closed on shutdown
+        self.client: Optional[httpx.AsyncClient] = None
+
+    # Open one long-lived HTTP/2 client with keep-alive pool for the whole process
+    async def start(self):
+        if self.client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=limits,
+            http2=settings.HTTP2_ENABLED
+        )
+        logger.info(f"OpenAI HTTP client started (http2={settings.HTTP2_ENABLED}, max_connections={settings.HTTP_MAX_CONNECTIONS})")
+
+    # Close pooled client and all its connections
+    async def close(self):
+        if self.client is None:
+            return
+        await self.client.aclose()
+        self.client = None
+        logger.info("OpenAI HTTP client closed")
+
+    def get_limiter_stats(self):
+        return upstream_limiter.get_stats()
+
+    # Connection pool stats for monitoring (open, idle and waiting connections)
+    def get_pool_stats(self):
+        stats = {"open": 0, "idle": 0, "active": 0, "waiting": 0}
+        if self.client is None:
+            return stats
+
+        # httpx doesn't expose pool stats publicly - read them from the httpcore pool.
+        # Private attributes may change in any httpx / httpcore release, stats are then empty.
+        try:
+            pool = getattr(self.client._transport, "_pool", None)
+            if pool is None:
+                return stats
+
+            connections = [c for c in pool.connections if not c.is_closed()]
+            stats["open"] = len(connections)
+            stats["idle"] = sum(1 for c in connections if c.is_idle())
+            stats["active"] = stats["open"] - stats["idle"]
+            stats["waiting"] = sum(1 for r in getattr(pool, "_requests", []) if r.is_queued())
+        except AttributeError:
+            return {}
+        return stats
         
     # Generate mockup image using OpenAI DALL-E.
     def create_prompt(self, keyword: str, industry: str, additional_details: Optional[str] = None):
@@ -44,8 +103,83 @@ class OpenAIService:
 
         return prompt
     
-    async def generate_mockup(self, keyword: str, industry: str, additional_details: Optional[str] = None):
-        
+    # POST to the image API through the shared rate limiter, retrying 429/5xx and network errors
+    # with jittered exponential backoff until MAX_RETRIES or the total deadline is reached.
+    # handler(response) reads the body of a successful response - errors while reading are retried too.
+    # Fills stats with attempts, retries, throttled (429 count) and throttle_wait (seconds).
+    async def _post_with_retries(self, payload: dict, headers: dict, stats: dict, handler):
+        deadline = time.monotonic() + self.timeout * settings.RETRY_DEADLINE_FACTOR
+        stats.update({"attempts": 0, "retries": 0, "throttled": 0, "throttle_wait": 0.0, "bytes_transferred": 0})
+
+        while True:
+            stats["throttle_wait"] += await upstream_limiter.acquire()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.TimeoutException("Upstream deadline exceeded while waiting for rate limiter")
+
+            stats["attempts"] += 1
+            retry_after = None
+            try:
+                request = self.client.build_request(
+                    "POST",
+                    self.api_url,
+                    json=payload,
+                    headers=headers,
+                    timeout=min(self.timeout, remaining)
+                )
+                response = await self.client.send(request, stream=True)
+                try:
+                    upstream_limiter.update_from_headers(response.headers)
+                    if response.status_code not in RETRYABLE_STATUSES:
+                        if response.is_error:
+                            await response.aread()
+                            response.raise_for_status()
+                        result = await handler(response)
+                        upstream_limiter.on_success()
+                        return result
+                finally:
+                    await response.aclose()
+                    # Wire size of every attempt, error bodies included
+                    stats["bytes_transferred"] += response.num_bytes_downloaded
+
+                retry_after = parse_retry_after(response.headers)
+                if response.status_code == 429:
+                    stats["throttled"] += 1
+                    upstream_limiter.on_throttle(retry_after)
+                error = httpx.HTTPStatusError(
+                    f"Upstream returned {response.status_code}",
+                    request=response.request,
+                    response=response
+                )
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                error = e
+
+            if stats["attempts"] > settings.MAX_RETRIES:
+                raise error
+
+            delay = max(backoff_delay(stats["attempts"]), retry_after or 0)
+            if time.monotonic() + delay >= deadline:
+                raise error
+
+            stats["retries"] += 1
+            logger.warning(f"OpenAI API attempt {stats['attempts']} failed ({str(error)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    # Output encoding parameters for the payload - request values fall back to settings.
+    # PNG is the API default and takes no compression, so nothing is sent for it.
+    @staticmethod
+    def output_options(output_format: Optional[str] = None, output_compression: Optional[int] = None):
+        output_format = (output_format or settings.OUTPUT_FORMAT).lower()
+        if output_format == "jpg":
+            output_format = "jpeg"
+        if output_format == "png":
+            return {}
+        if output_compression is None:
+            output_compression = settings.OUTPUT_COMPRESSION
+        return {"output_format": output_format, "output_compression": output_compression}
+
+    # Build prompt, headers and payload for image generation request
+    def _build_request(self, keyword: str, industry: str, additional_details: Optional[str] = None, n: int = 1, output: Optional[dict] = None):
         prompt = self.create_prompt(
             keyword, industry, additional_details
         )
@@ -60,35 +194,122 @@ class OpenAIService:
         payload = {
                     "model": self.model,
                     "prompt": prompt,
-                    "n": 1,
+                    "n": n,
                     "size": settings.IMAGE_SIZE,
                     #"response_format": "b64_json"
+                    **(output or {})
                 }
-        
+        return prompt, headers, payload
+
+    # Read whole JSON response into memory
+    @staticmethod
+    async def _read_json(response: httpx.Response):
+        await response.aread()
+        return response.json()
+
+    # Decode b64_json incrementally while the body streams in - returns (skeleton JSON, image buffers)
+    @staticmethod
+    async def _read_streamed(response: httpx.Response):
+        decoder = B64JsonStreamDecoder()
+        async for chunk in response.aiter_bytes():
+            decoder.feed(chunk)
+        return decoder.finish()
+
+    # Read server-sent events of a streamed generation (partial_images) - every partial image is
+    # handed to on_partial(index, image_bytes) as it arrives. Returns (skeleton JSON, image buffers).
+    @staticmethod
+    async def _read_events(response: httpx.Response, on_partial):
+        data = {"data": []}
+        images = []
+
+        async def dispatch(lines: list):
+            event = json.loads("\n".join(lines))
+            kind = event.get("type", "")
+            if kind.endswith("partial_image"):
+                await on_partial(event.get("partial_image_index", 0), base64.b64decode(event["b64_json"]))
+            elif kind.endswith("completed"):
+                images.append(base64.b64decode(event.pop("b64_json")))
+                data["data"].append(event)
+            elif "error" in event:
+                raise Exception(f"Image API stream error: {event['error']}")
+
+        lines = []
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                lines.append(line[5:].strip())
+            elif not line and lines:
+                await dispatch(lines)
+                lines = []
+        if lines:
+            await dispatch(lines)
+        return data, images
+
+    # Generate n variants in one upstream call - returns (list of decoded images, revised prompt).
+    # With OPENAI_STREAM_DECODE the base64 fields are decoded while streaming into spooled
+    # temp files, so memory per generation doesn't grow with image size.
+    # output: encoding parameters from output_options, images are returned in that encoding.
+    # on_partial: with OPENAI_PARTIAL_IMAGES the single-image response is streamed as events and
+    # on_partial(index, image_bytes) is awaited for every partial image before the final one.
+    async def generate_mockup_images(self, keyword: str, industry: str, additional_details: Optional[str] = None, n: int = 1, stats: Optional[dict] = None, output: Optional[dict] = None, on_partial=None):
+        with STAGE_PROMPT_BUILD.time():
+            prompt, headers, payload = self._build_request(keyword, industry, additional_details, n, output)
+
+        # Partial images are only streamed for single-image requests
+        stream_partials = on_partial is not None and settings.OPENAI_PARTIAL_IMAGES > 0 and n == 1
+        if stream_partials:
+            payload.update({"stream": True, "partial_images": settings.OPENAI_PARTIAL_IMAGES})
+
+        # Lazy start if service is used outside of app lifespan (e.g. scripts)
+        if self.client is None:
+            await self.start()
+
         try:
-            # Make async request to OpenAI API
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.api_url,
-                    json=payload,
-                    headers=headers
-                )
-                response.raise_for_status()
-            
-            
-
-            data = response.json()
-            image_b64 = data["data"][0]["b64_json"]
-            revised_prompt = data["data"][0].get("revised_prompt", prompt)
-            
-            logger.info(f"Mockup generated successfully for: {keyword}")
-            return image_b64, revised_prompt
-            
+            # Upstream stage covers rate limiter waits, retries and decoding of the response
+            with STAGE_UPSTREAM.time():
+                if stream_partials:
+                    data, images = await self._post_with_retries(
+                        payload,
+                        headers,
+                        stats if stats is not None else {},
+                        lambda response: self._read_events(response, on_partial)
+                    )
+                elif settings.OPENAI_STREAM_DECODE:
+                    data, images = await self._post_with_retries(
+                        payload,
+                        headers,
+                        stats if stats is not None else {},
+                        self._read_streamed
+                    )
+                else:
+                    data = await self._post_with_retries(
+                        payload,
+                        headers,
+                        stats if stats is not None else {},
+                        self._read_json
+                    )
+                    # Decode one by one and drop base64 right away
+                    images = []
+                    for item in data["data"]:
+                        images.append(base64.b64decode(item.pop("b64_json")))
+
+            if not images:
+                raise Exception("Image API response contains no image")
+
+            revised_prompt = data["data"][0].get("revised_prompt") or prompt
+
+            logger.info(f"{len(images)} mockup(s) generated successfully for: {keyword}")
+            return images, revised_prompt
+
         except httpx.HTTPError as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise Exception(f"Failed to generate mockup: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error in generate_mockup: {str(e)}")
+            logger.error(f"Unexpected error in generate_mockup_images: {str(e)}")
             raise
 
+    # Generate single mockup - returns (decoded image, revised prompt)
+    async def generate_mockup_image(self, keyword: str, industry: str, additional_details: Optional[str] = None, stats: Optional[dict] = None, output: Optional[dict] = None, on_partial=None):
+        images, revised_prompt = await self.generate_mockup_images(keyword, industry, additional_details, 1, stats, output, on_partial)
+        return images[0], revised_prompt
+
 openai_service = OpenAIService()
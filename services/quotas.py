@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from config import settings
+from services.rate_limiter import parse_duration
+
+# Seconds between removals of expired counters and idempotency keys
+PRUNE_INTERVAL = 300
+
+
+class QuotaExceededError(Exception):
+
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"Submission quota exceeded ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+# Request costs more than a quota allows in a whole window - no retry can succeed
+class QuotaCostError(Exception):
+
+    def __init__(self, scope: str, cost: int, limit: int):
+        super().__init__(f"Request creates {cost} mockups, the {scope} quota allows {limit}")
+        self.scope = scope
+        self.cost = cost
+        self.limit = limit
+
+
+# Idempotency-Key reused with a different request body
+class IdempotencyConflictError(Exception):
+    pass
+
+
+# Parse "<count>/<window>" list, e.g. "10/1h,50/24h" -> [(10, 3600.0), (50, 86400.0)]
+def parse_limits(value: Optional[str]):
+    limits = []
+    for item in (value or "").split(","):
+        count, _, window = item.partition("/")
+        seconds = parse_duration(window.strip())
+        if count.strip() and seconds:
+            limits.append((int(count), seconds))
+    return limits
+
+# Same mailbox for quota purposes - case and +tags don't make a new one
+def normalize_email(email: str):
+    local, _, domain = email.strip().lower().rpartition("@")
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+# Compact fixed-size identity - emails and IPs are not kept in plain text
+def _identity(value: str):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:24]
+
+# Counts of (current, previous) window at window index - older counts no longer matter
+def _roll(counter: Optional[tuple], index: int):
+    if counter is None:
+        return 0, 0
+    stored_index, current, previous = counter
+    if stored_index == index:
+        return current, previous
+    if stored_index == index - 1:
+        return 0, current
+    return 0, 0
+
+# Seconds until cost fits under limit: first the previous window's weight decays,
+# after the rollover the current window's count does
+def _retry_after(limit: int, window: float, elapsed: float, current: int, previous: int, cost: int):
+    excess = previous * (1 - elapsed / window) + current + cost - limit
+    if previous > 0:
+        wait = excess * window / previous
+        if elapsed + wait <= window:
+            return wait
+    remaining = window - elapsed
+    excess = current + cost - limit
+    if excess <= 0 or current <= 0:
+        return remaining
+    return min(remaining + excess * window / current, remaining + window)
+
+# Sliding window approximated from two fixed windows - the previous count weighted by its
+# overlap with the sliding window plus the current count. All rules must admit cost, a
+# negative cost (refund) is always admitted and never takes a count below zero.
+# rules: [(key, limit, window)], counters: key -> (window index, current, previous).
+# Returns (updated counters, None) or (None, (denied key, retry_after)).
+def evaluate(rules: list, counters: dict, cost: int, now: float):
+    updates = {}
+    for key, limit, window in rules:
+        index = int(now // window)
+        elapsed = now - index * window
+        current, previous = _roll(counters.get(key), index)
+        if cost > 0 and previous * (1 - elapsed / window) + current + cost > limit:
+            return None, (key, _retry_after(limit, window, elapsed, current, previous, cost))
+        updates[key] = (index, max(0, current + cost), previous, (index + 2) * window)
+    return updates, None
+
+
+# Process-local counters - a few dozen bytes per identity and window
+class MemoryQuotaStore:
+
+    def __init__(self):
+        # key -> (window index, current, previous, expires)
+        self._counters: dict = {}
+        # key -> (fingerprint, response, expires)
+        self._idempotency: dict = {}
+        self._pruned = time.time()
+
+    def _prune(self, now: float):
+        if now - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        self._counters = {key: value for key, value in self._counters.items() if value[3] > now}
+        self._idempotency = {key: value for key, value in self._idempotency.items() if value[2] > now}
+
+    # Check all rules and count cost against them, or nothing when one of them denies
+    async def consume(self, rules: list, cost: int, now: float):
+        self._prune(now)
+        counters = {key: self._counters[key][:3] for key, _, _ in rules if key in self._counters}
+        updates, denied = evaluate(rules, counters, cost, now)
+        if updates:
+            self._counters.update(updates)
+        return denied
+
+    # Store response under key unless the key is taken - returns (fingerprint, response) already stored
+    async def reserve(self, key: str, fingerprint: str, response: str, ttl: float, now: float):
+        stored = self._idempotency.get(key)
+        if stored is not None and stored[2] > now:
+            return stored[0], stored[1]
+        self._idempotency[key] = (fingerprint, response, now + ttl)
+        return None
+
+    async def release(self, key: str):
+        self._idempotency.pop(key, None)
+
+    def size(self):
+        return {"counters": len(self._counters), "idempotency_keys": len(self._idempotency)}
+
+    async def close(self):
+        pass
+
+
+# SQLite in WAL mode - counters and idempotency keys shared by all uvicorn workers on the host
+class SQLiteQuotaStore:
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection per process, used from worker threads one at a time
+        self._lock = threading.Lock()
+        self._pruned = time.time()
+
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS counters (
+                    key TEXT PRIMARY KEY,
+                    window_index INTEGER NOT NULL,
+                    current INTEGER NOT NULL,
+                    previous INTEGER NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    # Run blocking sqlite call in a thread so the event loop never waits on disk or locks
+    async def _run(self, fn, *args):
+        def call():
+            with self._lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(call)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        if now - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        conn.execute("DELETE FROM counters WHERE expires < ?", (now,))
+        conn.execute("DELETE FROM idempotency WHERE expires < ?", (now,))
+
+    async def consume(self, rules: list, cost: int, now: float):
+        def op(conn):
+            # Read and update in one write transaction - atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._prune(conn, now)
+                keys = [key for key, _, _ in rules]
+                counters = {
+                    row[0]: tuple(row[1:])
+                    for row in conn.execute(
+                        f"SELECT key, window_index, current, previous FROM counters WHERE key IN ({','.join('?' * len(keys))})",
+                        keys
+                    )
+                }
+                updates, denied = evaluate(rules, counters, cost, now)
+                if updates:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO counters (key, window_index, current, previous, expires) VALUES (?, ?, ?, ?, ?)",
+                        [(key, *value) for key, value in updates.items()]
+                    )
+                conn.execute("COMMIT")
+                return denied
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return await self._run(op)
+
+    async def reserve(self, key: str, fingerprint: str, response: str, ttl: float, now: float):
+        def op(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT fingerprint, response FROM idempotency WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO idempotency (key, fingerprint, response, expires) VALUES (?, ?, ?, ?)",
+                        (key, fingerprint, response, now + ttl)
+                    )
+                conn.execute("COMMIT")
+                return tuple(row) if row else None
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return await self._run(op)
+
+    async def release(self, key: str):
+        def op(conn):
+            conn.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+        await self._run(op)
+
+    def size(self):
+        return {}
+
+    async def close(self):
+        def op(conn):
+            conn.close()
+        if self._conn is not None:
+            await self._run(op)
+            self._conn = None
+
+
+# Per-email and per-client-IP submission quotas (sliding windows) and idempotency keys.
+# Both are checked in the request handler before any task record is created or job queued.
+class SubmissionQuotas:
+
+    def __init__(self, store):
+        self.store = store
+        self.email_limits = parse_limits(settings.QUOTA_PER_EMAIL)
+        self.ip_limits = parse_limits(settings.QUOTA_PER_IP)
+        self.stats = {"admitted": 0, "refunded": 0, "rejected_email": 0, "rejected_ip": 0, "replayed": 0, "conflicts": 0}
+
+    # Counter rules of the sender - [(key, limit, window)]
+    def _rules(self, email: str, client_ip: Optional[str]):
+        identity = _identity(normalize_email(email))
+        rules = [(f"email:{int(window)}:{identity}", limit, window) for limit, window in self.email_limits]
+        if client_ip:
+            identity = _identity(client_ip)
+            rules += [(f"ip:{int(window)}:{identity}", limit, window) for limit, window in self.ip_limits]
+        return rules
+
+    # Count cost (number of tasks) against the sender's quotas - raises QuotaExceededError,
+    # or QuotaCostError when cost is over a limit even with an empty window
+    async def admit(self, email: str, client_ip: Optional[str], cost: int = 1):
+        rules = self._rules(email, client_ip)
+        if not rules:
+            return
+        for key, limit, _ in rules:
+            if cost > limit:
+                scope = key.split(":", 1)[0]
+                self.stats[f"rejected_{scope}"] += 1
+                raise QuotaCostError(scope, cost, limit)
+
+        denied = await self.store.consume(rules, cost, time.time())
+        if denied is None:
+            self.stats["admitted"] += 1
+            return
+        key, retry_after = denied
+        scope = key.split(":", 1)[0]
+        self.stats[f"rejected_{scope}"] += 1
+        raise QuotaExceededError(scope, max(1, math.ceil(retry_after)))
+
+    # Give back cost admitted for a submission that was not queued after all
+    async def refund(self, email: str, client_ip: Optional[str], cost: int = 1):
+        rules = self._rules(email, client_ip)
+        if rules:
+            await self.store.consume(rules, -cost, time.time())
+            self.stats["refunded"] += 1
+
+    @staticmethod
+    def _key(endpoint: str, email: str, idempotency_key: str):
+        return _identity(f"{endpoint}\n{normalize_email(email)}\n{idempotency_key}")
+
+    # Reserve idempotency key with the response of this submission. Returns the stored response
+    # when the key was used before (same request body), None when this submission goes ahead.
+    async def claim_idempotency_key(self, endpoint: str, email: str, idempotency_key: Optional[str], body: str, response: dict):
+        if not idempotency_key:
+            return None
+        fingerprint = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        stored = await self.store.reserve(
+            self._key(endpoint, email, idempotency_key), fingerprint, json.dumps(response),
+            settings.IDEMPOTENCY_TTL, time.time()
+        )
+        if stored is None:
+            return None
+        if stored[0] != fingerprint:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflictError("Idempotency-Key was used with a different request")
+        self.stats["replayed"] += 1
+        return json.loads(stored[1])
+
+    # Submission failed before it was queued - a retry with the same key may go ahead
+    async def release_idempotency_key(self, endpoint: str, email: str, idempotency_key: Optional[str]):
+        if idempotency_key:
+            await self.store.release(self._key(endpoint, email, idempotency_key))
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            **self.store.size(),
+            "backend": settings.QUOTA_BACKEND,
+            "per_email": settings.QUOTA_PER_EMAIL,
+            "per_ip": settings.QUOTA_PER_IP
+        }
+
+    async def close(self):
+        await self.store.close()
+
+
+# Pick backend from settings
+def create_quota_store():
+    if settings.QUOTA_BACKEND == "sqlite":
+        return SQLiteQuotaStore(settings.QUOTA_STORE_PATH)
+    return MemoryQuotaStore()
+
+submission_quotas = SubmissionQuotas(create_quota_store())
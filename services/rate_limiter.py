@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Duration format used by x-ratelimit-reset-* headers, e.g. "1s", "6m0s", "20ms", "1h2m3.5s"
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+# Parse reset duration header to seconds, None when unparseable
+def parse_duration(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+# Parse Retry-After header (seconds only - the image API doesn't send HTTP dates)
+def parse_retry_after(headers):
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+# Client-side token bucket that adapts to the rate limit headers returned by the upstream API.
+# Rate is cut in half on every 429 and grows back additively on success (AIMD),
+# never above the limit advertised by x-ratelimit-limit-requests.
+class AdaptiveRateLimiter:
+
+    def __init__(self, requests_per_minute: float, burst: int):
+        self.max_rate = requests_per_minute / 60
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        # Nobody sends until this moment (set from Retry-After / exhausted quota)
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {"acquired": 0, "throttled": 0, "wait_total": 0.0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Wait for a token - returns seconds spent waiting
+    async def acquire(self):
+        started = time.monotonic()
+        # Lock keeps waiters in FIFO order so nobody starves
+        async with self._lock:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+        waited = time.monotonic() - started
+        self.stats["acquired"] += 1
+        self.stats["wait_total"] += waited
+        return waited
+
+    # Adjust to the quota reported by the upstream
+    def update_from_headers(self, headers):
+        limit = headers.get("x-ratelimit-limit-requests")
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+
+        if limit:
+            try:
+                self.max_rate = max(float(limit) / 60, self.min_rate)
+                self.rate = min(self.rate, self.max_rate)
+            except ValueError:
+                pass
+        if remaining is not None:
+            try:
+                remaining = int(remaining)
+            except ValueError:
+                return
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining == 0 and reset:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+    # Upstream answered 429 - back off for everyone
+    def on_throttle(self, retry_after: Optional[float]):
+        self.stats["throttled"] += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._refill()
+        self.tokens = 0.0
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        logger.warning(f"Upstream throttled, rate lowered to {self.rate * 60:.1f}/min")
+
+    # Successful call - slowly win back throughput
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "rate_per_minute": round(self.rate * 60, 2),
+            "max_rate_per_minute": round(self.max_rate * 60, 2),
+            "tokens": round(self.tokens, 2),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2)
+        }
+
+
+# Full-jitter exponential backoff delay for given attempt (1-based)
+def backoff_delay(attempt: int):
+    ceiling = min(settings.RETRY_BACKOFF_MAX, settings.RETRY_BACKOFF_BASE * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+upstream_limiter = AdaptiveRateLimiter(settings.UPSTREAM_REQUESTS_PER_MINUTE, settings.UPSTREAM_BURST)
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds between re-scans of the disk tier - picks up entries and usage of other workers
+DISK_RESCAN_INTERVAL = 60
+
+
+# Entries kept in memory at most - mapped buffers count no bytes but each holds a file descriptor
+MEMORY_MAX_ENTRIES = 1024
+
+
+# Heap bytes held by image data - mmap-backed buffers of streamed responses live in the page cache
+def _heap_size(image_data):
+    return len(image_data) if isinstance(image_data, (bytes, bytearray)) else 0
+
+
+# Content-addressed cache of generated mockups with single-flight deduplication.
+# Tier 1: in-memory LRU, tier 2: files under IMAGE_STORAGE_PATH/.cache - both evicted by size and TTL.
+# The disk tier is shared by all workers on the host: entries missing from this worker's index are
+# looked up on disk, and the index is re-scanned every DISK_RESCAN_INTERVAL before enforcing
+# RESULT_CACHE_DISK_MB, so the limit applies to the directory rather than to each worker.
+class ResultCache:
+
+    def __init__(self):
+        self.enabled = settings.RESULT_CACHE_ENABLED
+        self.ttl = settings.RESULT_CACHE_TTL
+        self.memory_limit = settings.RESULT_CACHE_MEMORY_MB * 1024 * 1024
+        self.disk_limit = settings.RESULT_CACHE_DISK_MB * 1024 * 1024
+        self.cache_path = Path(settings.IMAGE_STORAGE_PATH) / ".cache"
+
+        # key -> (image_bytes, revised_prompt, created_at)
+        self._memory: OrderedDict = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (size, created_at), oldest first - loaded from disk on first use
+        self._disk_index: Optional[OrderedDict] = None
+        self._disk_bytes = 0
+        self._disk_scanned = 0.0
+        # key -> Future shared by identical requests already in flight
+        self._inflight: dict = {}
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "shared": 0, "misses": 0, "evictions": 0}
+
+    # Normalize free text so trivial differences (case, spacing) map to the same key
+    @staticmethod
+    def normalize(text: Optional[str]):
+        if not text:
+            return ""
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    # Cache key - hash of normalized prompt inputs, model, image size and output encoding
+    def make_key(self, keyword: str, industry: str, additional_details: Optional[str] = None, output: Optional[dict] = None):
+        parts = [
+            self.normalize(keyword),
+            industry,
+            self.normalize(additional_details),
+            settings.OPENAI_MODEL,
+            settings.IMAGE_SIZE
+        ]
+        # PNG (no output options) keeps the keys of entries cached before formats were configurable
+        if output:
+            parts.append(output)
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    # Return cached (image_bytes, revised_prompt, source) or run generator once for all identical callers.
+    # source: 'memory', 'disk', 'shared' (joined in-flight call) or 'generated'
+    async def get_or_generate(self, key: str, generator):
+        if not self.enabled:
+            image_data, revised_prompt = await generator()
+            return image_data, revised_prompt, "generated"
+
+        cached = self._get_memory(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached[0], cached[1], "memory"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["shared"] += 1
+            image_data, revised_prompt = await asyncio.shield(inflight)
+            return image_data, revised_prompt, "shared"
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            cached = await self._get_disk(key)
+            if cached is not None:
+                self.stats["disk_hits"] += 1
+                self._put_memory(key, *cached)
+                source = "disk"
+            else:
+                self.stats["misses"] += 1
+                cached = await generator()
+                self._put_memory(key, *cached)
+                await self._put_disk(key, *cached)
+                source = "generated"
+            future.set_result(cached)
+            return cached[0], cached[1], source
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting - mark exception as retrieved to avoid asyncio warning
+            future.exception()
+            raise
+        finally:
+            # Leader cancelled (e.g. worker stopped after the drain timeout) - followers fail instead of waiting forever
+            if not future.done():
+                future.set_exception(Exception("Generation was cancelled"))
+                future.exception()
+            del self._inflight[key]
+
+    # Cached (image_bytes, revised_prompt, source) under key without generating, None when absent
+    async def get(self, key: str):
+        if not self.enabled:
+            return None
+        cached = self._get_memory(key)
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached[0], cached[1], "memory"
+        cached = await self._get_disk(key)
+        if cached is None:
+            return None
+        self.stats["disk_hits"] += 1
+        self._put_memory(key, *cached)
+        return cached[0], cached[1], "disk"
+
+    def _expired(self, created_at: float):
+        return time.time() - created_at > self.ttl
+
+    # Memory tier
+
+    def _get_memory(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[2]):
+            self._drop_memory(key)
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key: str, image_data: bytes, revised_prompt: str):
+        if _heap_size(image_data) > self.memory_limit:
+            return
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (image_data, revised_prompt, time.time())
+        self._memory_bytes += _heap_size(image_data)
+        while self._memory_bytes > self.memory_limit or len(self._memory) > MEMORY_MAX_ENTRIES:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self.stats["evictions"] += 1
+
+    def _drop_memory(self, key: str):
+        image_data, _, _ = self._memory.pop(key)
+        self._memory_bytes -= _heap_size(image_data)
+
+    # Disk tier - blocking file operations run in a thread
+
+    def _entry_paths(self, key: str):
+        directory = self.cache_path / key[:2]
+        return directory / f"{key}.bin", directory / f"{key}.json"
+
+    # (size, created_at) of the entry on disk, None when absent or incomplete
+    def _stat_entry(self, key: str):
+        data_path, meta_path = self._entry_paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            return data_path.stat().st_size, meta["created_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # Index of all cached files, written by any worker - oldest first
+    def _scan_disk(self):
+        entries = []
+        if self.cache_path.exists():
+            for meta_path in self.cache_path.glob("*/*.json"):
+                entry = self._stat_entry(meta_path.stem)
+                if entry is not None:
+                    entries.append((entry[1], meta_path.stem, entry[0]))
+        entries.sort()
+        return OrderedDict((key, (size, created)) for created, key, size in entries)
+
+    async def _load_disk_index(self):
+        self._disk_index = await asyncio.to_thread(self._scan_disk)
+        self._disk_bytes = sum(size for size, _ in self._disk_index.values())
+        self._disk_scanned = time.monotonic()
+
+    def _read_disk(self, key: str):
+        data_path, meta_path = self._entry_paths(key)
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return data_path.read_bytes(), meta["revised_prompt"]
+
+    def _write_disk(self, key: str, image_data: bytes, revised_prompt: str, created_at: float):
+        data_path, meta_path = self._entry_paths(key)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to temp file and rename - readers never see partial entries
+        tmp_path = data_path.with_suffix(".tmp")
+        tmp_path.write_bytes(image_data)
+        os.replace(tmp_path, data_path)
+        meta_path.write_text(json.dumps({"revised_prompt": revised_prompt, "created_at": created_at}), encoding="utf-8")
+
+    def _remove_disk(self, key: str):
+        for path in self._entry_paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def _get_disk(self, key: str):
+        if self._disk_index is None:
+            await self._load_disk_index()
+        entry = self._disk_index.get(key)
+        if entry is None:
+            # Possibly written by another worker since the last scan
+            entry = await asyncio.to_thread(self._stat_entry, key)
+            if entry is None:
+                return None
+            self._disk_index[key] = entry
+            self._disk_bytes += entry[0]
+        if self._expired(entry[1]):
+            await self._drop_disk(key)
+            return None
+        try:
+            return await asyncio.to_thread(self._read_disk, key)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Broken cache entry {key}: {str(e)}")
+            await self._drop_disk(key)
+            return None
+
+    async def _put_disk(self, key: str, image_data: bytes, revised_prompt: str):
+        if len(image_data) > self.disk_limit:
+            return
+        created_at = time.time()
+        try:
+            await asyncio.to_thread(self._write_disk, key, image_data, revised_prompt, created_at)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+            return
+        if time.monotonic() - self._disk_scanned > DISK_RESCAN_INTERVAL:
+            # Usage of all workers - includes the entry just written
+            await self._load_disk_index()
+        else:
+            if key in self._disk_index:
+                self._disk_bytes -= self._disk_index.pop(key)[0]
+            self._disk_index[key] = (len(image_data), created_at)
+            self._disk_bytes += len(image_data)
+
+        # Oldest entries go first - with TTL-only reads this matches insertion order
+        while self._disk_bytes > self.disk_limit and self._disk_index:
+            oldest = next(iter(self._disk_index))
+            await self._drop_disk(oldest)
+            self.stats["evictions"] += 1
+
+    async def _drop_disk(self, key: str):
+        # A re-scan may have replaced the index meanwhile
+        entry = self._disk_index.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry[0]
+        await asyncio.to_thread(self._remove_disk, key)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+            "disk_bytes": self._disk_bytes,
+            "inflight": len(self._inflight)
+        }
+
+result_cache = ResultCache()
@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+from config import settings
+from services.rate_limiter import backoff_delay
+from services.sigv4 import amz_timestamp, canonical_query, sign_request, uri_encode
+
+logger = logging.getLogger(__name__)
+
+# Where stored mockups are kept for serving. Files are always written to IMAGE_STORAGE_PATH
+# first - Pillow, derivatives and email attachments work on local files - and a backend
+# other than local copies them further (write-through), so any node can serve any mockup.
+
+# Content-hashed files never change under the same name
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Length of content hash used in filenames (hex chars)
+CONTENT_HASH_LENGTH = 32
+
+# Stored files are named FILENAME_PREFIX + content hash (+ derivative suffix) + extension
+FILENAME_PREFIX = "mockup_"
+
+# Stored mockup or derivative file name
+CONTENT_HASHED_NAME = re.compile(rf"^{FILENAME_PREFIX}[0-9a-f]{{{CONTENT_HASH_LENGTH}}}(_[a-z]+)?\.[a-z0-9]+$")
+
+# Name of mockups saved before content addressing - mockup_<keyword>_<YYYYmmdd_HHMMSS>(_<derivative>).png
+LEGACY_NAME = re.compile(rf"^({FILENAME_PREFIX}\w*_\d{{8}}_\d{{6}})(_[a-z]+)?\.[a-z]+$")
+
+def is_stored_name(filename: str):
+    return bool(CONTENT_HASHED_NAME.match(filename) or LEGACY_NAME.match(filename))
+
+# Hash chars naming the shard subdirectory - 256 shards keep directories small
+SHARD_LENGTH = 2
+
+# Content hash of the original a stored file belongs to - derivatives share it.
+# Legacy files are keyed by the hash of the original's name.
+def content_digest(filename: str):
+    legacy = LEGACY_NAME.match(filename)
+    if legacy is None:
+        return filename[len(FILENAME_PREFIX):len(FILENAME_PREFIX) + CONTENT_HASH_LENGTH]
+    return hashlib.sha256(legacy.group(1).encode("utf-8")).hexdigest()[:CONTENT_HASH_LENGTH]
+
+# Files live in a subdirectory named by the first hash chars: <storage>/3f/mockup_3f2a....png.
+# URLs stay flat (/mockups/<filename>), derivatives are written next to their original.
+def shard_relpath(filename: str):
+    return os.path.join(content_digest(filename)[:SHARD_LENGTH], filename)
+
+def shard_path(storage_dir: str, filename: str):
+    return Path(storage_dir) / shard_relpath(filename)
+
+# Object store statuses worth retrying
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+# Keys known to exist in the bucket - bounded, content-hashed keys never need re-checking
+KNOWN_KEYS_MAX = 65536
+
+
+# Base interface for mockup storage
+class StorageBackend:
+
+    name = "base"
+    # Serve /mockups by redirecting to the backend instead of streaming the file
+    redirects = False
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Make the stored local file available through the backend. Returns True if it was uploaded.
+    async def put(self, filename: str, file_path: str):
+        return False
+
+    # Public URL handed out in task records and emails
+    def url(self, filename: str):
+        return f"{settings.API_URL}/mockups/{filename}"
+
+    # Where /mockups/<filename> redirects to (only for backends with redirects)
+    def redirect_url(self, filename: str):
+        raise NotImplementedError
+
+    # Cache-Control of the redirect response
+    def redirect_cache_control(self):
+        return IMMUTABLE_CACHE_CONTROL
+
+    def get_stats(self):
+        return {"backend": self.name}
+
+
+# Single node - files stay in IMAGE_STORAGE_PATH and the app serves them
+class LocalStorage(StorageBackend):
+
+    name = "local"
+
+
+# Read one part of a local file and hash it - runs in a thread, off the event loop
+def _read_part(file_path: str, offset: int, size: int):
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    return data, hashlib.sha256(data).hexdigest()
+
+# Text of the first element with given local name (S3 XML uses a default namespace)
+def _xml_text(body: bytes, name: str):
+    for element in ElementTree.fromstring(body).iter():
+        if element.tag.rsplit("}", 1)[-1] == name:
+            return element.text
+    return None
+
+
+# S3-compatible object store (AWS S3, MinIO, R2, ...) with path-style addressing.
+# Uploads are async over one pooled httpx client - files above the multipart threshold
+# go up as concurrent parts. /mockups redirects to S3_PUBLIC_URL when set (bucket behind
+# a CDN), otherwise to a presigned GET URL, so API nodes never stream image bytes.
+class S3Storage(StorageBackend):
+
+    name = "s3"
+    redirects = True
+
+    def __init__(self):
+        endpoint = urlsplit(settings.S3_ENDPOINT_URL)
+        self.endpoint = f"{endpoint.scheme}://{endpoint.netloc}"
+        self.host = endpoint.netloc
+        self.bucket = settings.S3_BUCKET
+        self.region = settings.S3_REGION
+        self.prefix = settings.S3_PREFIX.strip("/")
+        self.access_key = settings.S3_ACCESS_KEY_ID
+        self.secret_key = settings.S3_SECRET_ACCESS_KEY
+        self.public_url = settings.S3_PUBLIC_URL.rstrip("/")
+        self.part_size = max(5, settings.S3_PART_SIZE_MB) * 1024 * 1024
+        self.multipart_threshold = settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024
+        self.client = None
+        # Requests in flight - single PUTs and parts alike
+        self._slots = asyncio.Semaphore(settings.S3_UPLOAD_CONCURRENCY)
+        self._known: set = set()
+        # filename -> task uploading it, concurrent puts of one file share the upload
+        self._uploading: dict = {}
+        self.stats = {
+            "uploads": 0,
+            "multipart_uploads": 0,
+            "parts": 0,
+            "skipped": 0,
+            "failed": 0,
+            "retries": 0,
+            "bytes_uploaded": 0,
+            "upload_time_total": 0.0,
+            "redirects": 0
+        }
+
+    async def start(self):
+        if self.client is not None:
+            return
+        import httpx
+        self.client = httpx.AsyncClient(
+            timeout=settings.REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.S3_UPLOAD_CONCURRENCY * 2)
+        )
+        logger.info(f"S3 storage started ({self.endpoint}/{self.bucket}, prefix={self.prefix or '-'})")
+
+    async def close(self):
+        if self.client is None:
+            return
+        await self.client.aclose()
+        self.client = None
+        logger.info("S3 storage closed")
+
+    def key(self, filename: str):
+        return f"{self.prefix}/{filename}" if self.prefix else filename
+
+    def _path(self, key: str):
+        return f"/{self.bucket}/{key}"
+
+    # Signed request with retries on 5xx and network errors. Non-retryable errors raise.
+    async def _request(
+        self, method: str, key: str, query: Optional[dict] = None, body: bytes = b"",
+        payload_hash: Optional[str] = None, headers: Optional[dict] = None, allow_404: bool = False
+    ):
+        import httpx
+        query = query or {}
+        payload_hash = payload_hash or hashlib.sha256(body).hexdigest()
+        attempt = 0
+        while True:
+            attempt += 1
+            timestamp = amz_timestamp()
+            signed = {"host": self.host, "x-amz-content-sha256": payload_hash, "x-amz-date": timestamp}
+            signature, signed_headers = sign_request(
+                method, self._path(key), query, signed, payload_hash,
+                self.access_key, self.secret_key, self.region, timestamp
+            )
+            request_headers = {
+                **(headers or {}),
+                "x-amz-content-sha256": payload_hash,
+                "x-amz-date": timestamp,
+                "authorization": (
+                    f"AWS4-HMAC-SHA256 Credential={self.access_key}/{timestamp[:8]}/{self.region}/s3/aws4_request, "
+                    f"SignedHeaders={signed_headers}, Signature={signature}"
+                )
+            }
+            url = self.endpoint + uri_encode(self._path(key), safe="/-_.~")
+            if query:
+                url += "?" + canonical_query(query)
+
+            try:
+                response = await self.client.request(method, url, content=body, headers=request_headers)
+                if allow_404 and response.status_code == 404:
+                    return response
+                if response.status_code not in RETRYABLE_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"Object store returned {response.status_code}",
+                    request=response.request,
+                    response=response
+                )
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                error = e
+
+            if attempt > settings.STORAGE_RETRIES:
+                raise error
+            delay = backoff_delay(attempt)
+            self.stats["retries"] += 1
+            logger.warning(f"S3 {method} {key} attempt {attempt} failed ({str(error)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def _object_headers(self, filename: str):
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return {"content-type": content_type, "cache-control": IMMUTABLE_CACHE_CONTROL}
+
+    # Upload local file unless the bucket already has it - names are content hashes,
+    # an existing key holds the same bytes (uploaded earlier or by another node)
+    async def put(self, filename: str, file_path: str):
+        key = self.key(filename)
+        if key in self._known:
+            self.stats["skipped"] += 1
+            return False
+
+        upload = self._uploading.get(key)
+        if upload is None:
+            upload = self._uploading[key] = asyncio.ensure_future(self._upload(key, filename, str(file_path)))
+            upload.add_done_callback(lambda _: self._uploading.pop(key, None))
+        uploaded = await asyncio.shield(upload)
+
+        if len(self._known) >= KNOWN_KEYS_MAX:
+            self._known.clear()
+        self._known.add(key)
+        return uploaded
+
+    async def _upload(self, key: str, filename: str, file_path: str):
+        started = time.monotonic()
+        try:
+            response = await self._request("HEAD", key, allow_404=True)
+            if response.status_code == 200:
+                self.stats["skipped"] += 1
+                return False
+
+            size = os.path.getsize(file_path)
+            if size > self.multipart_threshold:
+                await self._upload_multipart(key, filename, file_path, size)
+            else:
+                data, payload_hash = await asyncio.to_thread(_read_part, file_path, 0, size)
+                async with self._slots:
+                    await self._request(
+                        "PUT", key, body=data, payload_hash=payload_hash, headers=self._object_headers(filename)
+                    )
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"S3 upload of {key} failed: {str(e)}")
+            raise
+
+        self.stats["uploads"] += 1
+        self.stats["bytes_uploaded"] += size
+        self.stats["upload_time_total"] += time.monotonic() - started
+        return True
+
+    # Multipart upload - parts are read and sent concurrently (bounded by S3_UPLOAD_CONCURRENCY),
+    # the upload is aborted on failure so the bucket keeps no orphaned parts
+    async def _upload_multipart(self, key: str, filename: str, file_path: str, size: int):
+        response = await self._request("POST", key, query={"uploads": ""}, headers=self._object_headers(filename))
+        upload_id = _xml_text(response.content, "UploadId")
+        if not upload_id:
+            raise RuntimeError(f"No UploadId in CreateMultipartUpload response for {key}")
+
+        async def upload_part(number: int, offset: int):
+            async with self._slots:
+                data, payload_hash = await asyncio.to_thread(_read_part, file_path, offset, self.part_size)
+                part = await self._request(
+                    "PUT", key, query={"partNumber": number, "uploadId": upload_id},
+                    body=data, payload_hash=payload_hash
+                )
+            self.stats["parts"] += 1
+            return number, part.headers["etag"]
+
+        try:
+            parts = await asyncio.gather(*(
+                upload_part(number, offset)
+                for number, offset in enumerate(range(0, size, self.part_size), start=1)
+            ))
+            body = "<CompleteMultipartUpload>" + "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts
+            ) + "</CompleteMultipartUpload>"
+            response = await self._request("POST", key, query={"uploadId": upload_id}, body=body.encode("utf-8"))
+            # Complete can fail with 200 and an error document
+            if _xml_text(response.content, "Code"):
+                raise RuntimeError(f"CompleteMultipartUpload failed for {key}: {response.text[:200]}")
+        except BaseException:
+            try:
+                await self._request("DELETE", key, query={"uploadId": upload_id}, allow_404=True)
+            except Exception as e:
+                logger.warning(f"S3 abort of multipart upload {key} failed: {str(e)}")
+            raise
+        self.stats["multipart_uploads"] += 1
+
+    def url(self, filename: str):
+        if self.public_url:
+            return f"{self.public_url}/{uri_encode(self.key(filename), safe='/-_.~')}"
+        return super().url(filename)
+
+    # Public URL of the object, or a GET URL presigned for S3_PRESIGN_EXPIRES seconds
+    def redirect_url(self, filename: str):
+        self.stats["redirects"] += 1
+        if self.public_url:
+            return self.url(filename)
+        return self.presigned_url(filename)
+
+    # Public object URL never changes, a presigned one is cached for half its lifetime
+    def redirect_cache_control(self):
+        if self.public_url:
+            return IMMUTABLE_CACHE_CONTROL
+        return f"private, max-age={settings.S3_PRESIGN_EXPIRES // 2}"
+
+    def presigned_url(self, filename: str, expires: Optional[int] = None):
+        key = self.key(filename)
+        timestamp = amz_timestamp()
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{timestamp[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": timestamp,
+            "X-Amz-Expires": expires or settings.S3_PRESIGN_EXPIRES,
+            "X-Amz-SignedHeaders": "host"
+        }
+        signature, _ = sign_request(
+            "GET", self._path(key), query, {"host": self.host}, "UNSIGNED-PAYLOAD",
+            self.access_key, self.secret_key, self.region, timestamp
+        )
+        path = uri_encode(self._path(key), safe="/-_.~")
+        return f"{self.endpoint}{path}?{canonical_query(query)}&X-Amz-Signature={signature}"
+
+    def get_stats(self):
+        uploads = self.stats["uploads"] or 1
+        return {
+            "backend": self.name,
+            **self.stats,
+            "upload_time_avg": self.stats["upload_time_total"] / uploads,
+            "uploading": len(self._uploading)
+        }
+
+
+def create_storage():
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage()
+    return LocalStorage()
+
+storage = create_storage()
@@ -0,0 +1,542 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from config import settings
+from services.metrics import STORAGE_EVICTED, STORAGE_RECLAIMED
+from services.storage import SHARD_LENGTH, content_digest, is_stored_name, shard_path
+
+logger = logging.getLogger(__name__)
+
+# Meta key of the sweep lease - one worker per host sweeps at a time
+SWEEP_LEASE = "sweep_lease"
+# Meta key set once all files on disk are indexed and moved into shards
+SCAN_DONE = "scan_done"
+# Suffix of files being evicted - not a stored name, so scans and URLs never pick them up
+EVICTING_SUFFIX = ".evicting"
+# Meta key with the time leftover temp files were last removed
+TEMP_SWEPT = "temp_swept"
+# Directories under IMAGE_STORAGE_PATH with their own limits - result cache and warm pool
+SIDE_DIRECTORIES = (".cache", ".warm_pool")
+
+
+# Names of stored mockup files directly in directory
+def _list_stored(directory: str):
+    try:
+        with os.scandir(directory) as entries:
+            return [entry.name for entry in entries if is_stored_name(entry.name) and entry.is_file()]
+    except FileNotFoundError:
+        return []
+
+# Shard subdirectories of the storage directory
+def _list_shards(directory: str):
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(
+                entry.name for entry in entries
+                if len(entry.name) == SHARD_LENGTH and entry.is_dir()
+                and all(char in "0123456789abcdef" for char in entry.name)
+            )
+    except FileNotFoundError:
+        return []
+
+# Index rows for files in directory, files still in the flat layout are moved into their shard first
+def _index_files(storage_dir: str, directory: str, names: list, move: bool):
+    rows = []
+    for name in names:
+        path = Path(directory) / name
+        try:
+            if move:
+                target = shard_path(storage_dir, name)
+                target.parent.mkdir(exist_ok=True)
+                os.replace(path, target)
+                path = target
+            stat = path.stat()
+        except FileNotFoundError:
+            # Removed or moved by another worker meanwhile
+            continue
+        rows.append((name, content_digest(name), stat.st_size, stat.st_mtime, stat.st_mtime))
+    return rows
+
+# Move files of claimed mockups aside - a file stored again meanwhile can still be put back.
+# Returns [(path, moved path, bytes)] of the files found.
+def _move_aside(storage_dir: str, names: list):
+    moved = []
+    for name in names:
+        # Flat path for files the first scan has not moved yet
+        for path in (shard_path(storage_dir, name), Path(storage_dir) / name):
+            aside = path.with_name(path.name + EVICTING_SUFFIX)
+            try:
+                size = path.stat().st_size
+                os.rename(path, aside)
+            except FileNotFoundError:
+                continue
+            moved.append((path, aside, size))
+            break
+    return moved
+
+# Delete files moved aside, put back those of kept mockups (same content, so replacing a
+# copy written meanwhile is harmless) - returns (files removed, bytes reclaimed)
+def _settle_moved(moved: list, kept: set):
+    removed = 0
+    reclaimed = 0
+    for path, aside, size in moved:
+        try:
+            if content_digest(path.name) in kept:
+                os.replace(aside, path)
+                continue
+            aside.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+        reclaimed += size
+    return removed, reclaimed
+
+# Files being written, claimed or evicted - left behind when their process crashed
+def _is_temporary(name: str):
+    return ".tmp" in name or name.endswith((".claimed", EVICTING_SUFFIX))
+
+# Bytes of all files under the side directories (result cache, warm pool)
+def _side_bytes(storage_dir: str):
+    total = 0
+    for side in SIDE_DIRECTORIES:
+        for root, _, names in os.walk(os.path.join(storage_dir, side)):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+    return total
+
+# Delete temp files not modified since cutoff anywhere in storage - returns (files, bytes)
+def _remove_temporary(storage_dir: str, cutoff: float):
+    removed = 0
+    reclaimed = 0
+    for root, _, names in os.walk(storage_dir):
+        for name in names:
+            if not _is_temporary(name):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+                # Renames (claims, evictions) update ctime only
+                if max(stat.st_mtime, stat.st_ctime) >= cutoff:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            reclaimed += stat.st_size
+    return removed, reclaimed
+
+# executemany in one transaction - autocommit would commit every row separately
+def _execute_batch(conn: sqlite3.Connection, query: str, rows: list):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(query, rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# Index of files stored under IMAGE_STORAGE_PATH - name, content digest (original and its
+# derivatives share it), size, created and last accessed time. SQLite in WAL mode shared by all
+# workers on the host; totals are kept by triggers, so quota checks never scan the table.
+# Access times are buffered in memory and written in batches - serving a file never touches the disk.
+class MockupIndex:
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection per process, used from worker threads one at a time
+        self._lock = threading.Lock()
+        # digest -> last access time, not written yet
+        self._touched: dict = {}
+
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_digest ON files (digest)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_created ON files (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_accessed ON files (accessed)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    files INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO totals (id, files, bytes) VALUES (1, 0, 0)")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS files_inserted AFTER INSERT ON files BEGIN
+                    UPDATE totals SET files = files + 1, bytes = bytes + NEW.bytes WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS files_deleted AFTER DELETE ON files BEGIN
+                    UPDATE totals SET files = files - 1, bytes = bytes - OLD.bytes WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS files_resized AFTER UPDATE OF bytes ON files BEGIN
+                    UPDATE totals SET bytes = bytes - OLD.bytes + NEW.bytes WHERE id = 1;
+                END
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    # Run blocking sqlite call in a thread so the event loop never waits on disk or locks
+    async def _run(self, fn, *args):
+        def call():
+            with self._lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(call)
+
+    # Add or refresh stored files - sizes are read from disk, created time is kept for known files.
+    # Returns paths no longer on disk (evicted by a sweep after they were found stored).
+    async def record(self, paths: list):
+        def op(conn):
+            now = time.time()
+            rows = []
+            missing = []
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    missing.append(path)
+                    continue
+                name = os.path.basename(path)
+                rows.append((name, content_digest(name), size, now, now))
+            _execute_batch(
+                conn,
+                "INSERT INTO files (name, digest, bytes, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET bytes = excluded.bytes, accessed = excluded.accessed",
+                rows
+            )
+            return missing
+        return await self._run(op)
+
+    # Files found on disk by the scan - rows already in the index are left as they are
+    async def add_scanned(self, rows: list):
+        def op(conn):
+            _execute_batch(
+                conn,
+                "INSERT OR IGNORE INTO files (name, digest, bytes, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        if rows:
+            await self._run(op)
+
+    # Remember access to a served file - cheap, written by flush_touches
+    def touch(self, filename: str):
+        self._touched[content_digest(filename)] = time.time()
+
+    async def flush_touches(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+
+        def op(conn):
+            _execute_batch(
+                conn,
+                "UPDATE files SET accessed = ? WHERE digest = ? AND accessed < ?",
+                [(accessed, digest, accessed) for digest, accessed in touched.items()]
+            )
+        await self._run(op)
+
+    # Up to limit mockups selected by query, always with all their derivatives - returns
+    # their (name, digest, accessed) rows. Rows stay in the index until remove_unchanged.
+    async def _claim(self, query: str, params: tuple):
+        def op(conn):
+            return conn.execute(
+                f"SELECT name, digest, accessed FROM files WHERE digest IN ({query})", params
+            ).fetchall()
+        return await self._run(op)
+
+    # Mockups created before cutoff and not accessed since idle_before, oldest first
+    async def claim_expired(self, cutoff: float, idle_before: float, limit: int):
+        return await self._claim(
+            "SELECT digest FROM files WHERE created < ? AND accessed < ? ORDER BY created LIMIT ?",
+            (cutoff, idle_before, limit)
+        )
+
+    # Least recently accessed mockups not accessed since idle_before, just enough to free excess bytes
+    async def claim_least_recent(self, idle_before: float, excess: int, limit: int):
+        return await self._claim(
+            """
+            SELECT digest FROM (
+                SELECT digest, accessed, SUM(bytes) OVER (ORDER BY accessed, name) - bytes AS preceding
+                FROM files WHERE accessed < ?
+            ) WHERE preceding < ? ORDER BY accessed LIMIT ?
+            """,
+            (idle_before, excess, limit)
+        )
+
+    # Remove claimed mockups whose rows are unchanged since the claim - a mockup recorded or
+    # accessed meanwhile was handed out again and is kept. Returns digests of kept mockups.
+    async def remove_unchanged(self, rows: list):
+        claimed: dict = {}
+        for name, digest, accessed in rows:
+            claimed.setdefault(digest, set()).add((name, accessed))
+
+        def op(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current: dict = {}
+                for name, digest, accessed in conn.execute(
+                    f"SELECT name, digest, accessed FROM files WHERE digest IN ({','.join('?' * len(claimed))})",
+                    list(claimed)
+                ):
+                    current.setdefault(digest, set()).add((name, accessed))
+                kept = {digest for digest, entries in claimed.items() if current.get(digest, entries) != entries}
+                removed = [digest for digest in claimed if digest not in kept]
+                if removed:
+                    conn.execute(f"DELETE FROM files WHERE digest IN ({','.join('?' * len(removed))})", removed)
+                conn.execute("COMMIT")
+                return kept
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return await self._run(op)
+
+    # (files, bytes) currently indexed
+    async def totals(self):
+        def op(conn):
+            return conn.execute("SELECT files, bytes FROM totals WHERE id = 1").fetchone()
+        return await self._run(op)
+
+    async def get_meta(self, key: str):
+        def op(conn):
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        return await self._run(op)
+
+    async def set_meta(self, key: str, value: str):
+        def op(conn):
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        await self._run(op)
+
+    # Take or renew a lease for ttl seconds - False while another owner holds it
+    async def acquire_lease(self, key: str, owner: str, ttl: float):
+        def op(conn):
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    holder, _, expires = row[0].rpartition(":")
+                    if holder != owner and float(expires) > now:
+                        conn.execute("COMMIT")
+                        return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, f"{owner}:{now + ttl}")
+                )
+                conn.execute("COMMIT")
+                return True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return await self._run(op)
+
+    async def close(self):
+        def op(conn):
+            conn.close()
+        if self._conn is not None:
+            await self.flush_touches()
+            await self._run(op)
+            self._conn = None
+
+
+# Background retention of IMAGE_STORAGE_PATH. Every STORAGE_GC_INTERVAL seconds one worker
+# per host sweeps incrementally: the first sweep indexes files already on disk and moves
+# the flat layout into shards, then mockups older than STORAGE_MAX_AGE_DAYS are evicted,
+# then least recently accessed ones until the total fits STORAGE_MAX_MB. The result cache
+# and warm pool directories count towards the total (they are bounded by their own settings),
+# temp files of crashed writers are removed after STORAGE_TMP_GRACE seconds. Work is done in
+# batches of STORAGE_GC_BATCH in threads, the event loop only awaits between batches.
+# With the s3 backend only the local cache copy is removed - the bucket keeps the object.
+class StorageRetention:
+
+    def __init__(self, index: MockupIndex):
+        self.index = index
+        self.storage_path = settings.IMAGE_STORAGE_PATH
+        self.interval = settings.STORAGE_GC_INTERVAL
+        self.batch = settings.STORAGE_GC_BATCH
+        self.max_bytes = settings.STORAGE_MAX_MB * 1024 * 1024
+        self.max_age = settings.STORAGE_MAX_AGE_DAYS * 86400
+        self.min_idle = settings.STORAGE_GC_MIN_IDLE
+        self.tmp_grace = settings.STORAGE_TMP_GRACE
+        self.owner = str(os.getpid())
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "sweeps": 0,
+            "indexed_files": 0,
+            "migrated_files": 0,
+            "evicted_files": 0,
+            "reclaimed_bytes": 0,
+            "temp_files_removed": 0,
+            "over_quota": 0,
+            "stored_files": None,
+            "stored_bytes": None,
+            "side_bytes": None,
+            "last_sweep": None
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.index.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    # One sweep - returns its report, or None when another worker holds the lease
+    async def sweep(self):
+        await self.index.flush_touches()
+        if not await self.index.acquire_lease(SWEEP_LEASE, self.owner, self.interval * 2):
+            return None
+
+        started = time.monotonic()
+        report = {"indexed_files": 0, "evicted_files": 0, "reclaimed_bytes": 0, "temp_files_removed": 0}
+        if await self.index.get_meta(SCAN_DONE) is None:
+            report["indexed_files"] = await self.scan()
+            await self.index.set_meta(SCAN_DONE, str(time.time()))
+
+        # Walks the whole storage - at most once per grace period
+        if time.time() - float(await self.index.get_meta(TEMP_SWEPT) or 0) >= self.tmp_grace:
+            removed, reclaimed = await asyncio.to_thread(_remove_temporary, self.storage_path, time.time() - self.tmp_grace)
+            await self.index.set_meta(TEMP_SWEPT, str(time.time()))
+            report["temp_files_removed"] = removed
+            report["reclaimed_bytes"] += reclaimed
+            self.stats["temp_files_removed"] += removed
+            self.stats["reclaimed_bytes"] += reclaimed
+
+        idle_before = time.time() - self.min_idle
+        if self.max_age > 0:
+            cutoff = time.time() - self.max_age
+            await self._evict("age", lambda: self.index.claim_expired(cutoff, idle_before, self.batch), report)
+
+        side_bytes = await asyncio.to_thread(_side_bytes, self.storage_path)
+        if self.max_bytes > 0:
+
+            async def over_quota():
+                _, stored_bytes = await self.index.totals()
+                excess = stored_bytes + side_bytes - self.max_bytes
+                if excess <= 0:
+                    return []
+                return await self.index.claim_least_recent(idle_before, excess, self.batch)
+            await self._evict("quota", over_quota, report)
+
+        stored_files, stored_bytes = await self.index.totals()
+        if self.max_bytes > 0 and stored_bytes + side_bytes > self.max_bytes:
+            # Everything left was accessed within STORAGE_GC_MIN_IDLE
+            self.stats["over_quota"] += 1
+            logger.warning(
+                f"Mockup storage over quota: {(stored_bytes + side_bytes) / 1048576:.1f} MB of "
+                f"{self.max_bytes / 1048576:.0f} MB ({side_bytes / 1048576:.1f} MB result cache and warm pool), "
+                f"remaining files were accessed in the last {self.min_idle}s"
+            )
+
+        report.update({
+            "stored_files": stored_files,
+            "stored_bytes": stored_bytes,
+            "side_bytes": side_bytes,
+            "duration": round(time.monotonic() - started, 3),
+            "finished_at": time.time()
+        })
+        self.stats["sweeps"] += 1
+        self.stats["stored_files"] = stored_files
+        self.stats["stored_bytes"] = stored_bytes
+        self.stats["side_bytes"] = side_bytes
+        self.stats["last_sweep"] = report
+        if report["evicted_files"] or report["indexed_files"] or report["temp_files_removed"]:
+            logger.info(
+                f"Storage sweep: indexed {report['indexed_files']}, evicted {report['evicted_files']} files, "
+                f"removed {report['temp_files_removed']} temp files, "
+                f"reclaimed {report['reclaimed_bytes'] / 1048576:.1f} MB, stored {stored_bytes / 1048576:.1f} MB "
+                f"in {report['duration']}s"
+            )
+        return report
+
+    # Claim and delete batches until claim returns nothing. Files are moved aside before their
+    # rows are removed: a request storing the same image meanwhile either changes the row (the
+    # mockup is kept and its files put back) or finds the file missing and writes it again.
+    async def _evict(self, reason: str, claim, report: dict):
+        while True:
+            rows = await claim()
+            if not rows:
+                return
+            moved = await asyncio.to_thread(_move_aside, self.storage_path, [name for name, _, _ in rows])
+            kept = await self.index.remove_unchanged(rows)
+            removed, reclaimed = await asyncio.to_thread(_settle_moved, moved, kept)
+            report["evicted_files"] += removed
+            report["reclaimed_bytes"] += reclaimed
+            self.stats["evicted_files"] += removed
+            self.stats["reclaimed_bytes"] += reclaimed
+            STORAGE_EVICTED.labels(reason=reason).inc(removed)
+            STORAGE_RECLAIMED.labels(reason=reason).inc(reclaimed)
+            # Let requests run between batches
+            await asyncio.sleep(0)
+
+    # Index files already on disk (first run, or after the index was lost) - flat files from
+    # before sharding are moved into their shard. Returns number of files indexed.
+    async def scan(self):
+        indexed = 0
+        shards = await asyncio.to_thread(_list_shards, self.storage_path)
+        directories = [(self.storage_path, True)]
+        directories += [(os.path.join(self.storage_path, shard), False) for shard in shards]
+
+        for directory, move in directories:
+            names = await asyncio.to_thread(_list_stored, directory)
+            for offset in range(0, len(names), self.batch):
+                rows = await asyncio.to_thread(
+                    _index_files, self.storage_path, directory, names[offset:offset + self.batch], move
+                )
+                await self.index.add_scanned(rows)
+                indexed += len(rows)
+                if move:
+                    self.stats["migrated_files"] += len(rows)
+                await asyncio.sleep(0)
+        self.stats["indexed_files"] += indexed
+        return indexed
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "max_bytes": self.max_bytes,
+            "max_age_days": settings.STORAGE_MAX_AGE_DAYS
+        }
+
+
+mockup_index = MockupIndex(settings.STORAGE_INDEX_PATH)
+storage_retention = StorageRetention(mockup_index)
@@ -0,0 +1,127 @@
+import base64
+import json
+import mmap
+import tempfile
+from config import settings
+
+# JSON key holding the base64 image in the image API response
+B64_FIELD = b'"b64_json"'
+WHITESPACE = b" \t\r\n"
+
+
+# Incremental decoder for image API responses.
+# Feeds raw JSON chunks, decodes every "b64_json" string straight into its own spooled
+# temp file and keeps the rest of the document (the "skeleton") as small JSON with
+# the base64 values replaced by empty strings. Memory use is bounded by chunk size
+# plus the spool threshold, regardless of image size.
+class B64JsonStreamDecoder:
+
+    SEARCH, VALUE_START, VALUE = range(3)
+
+    def __init__(self, skeleton_limit: int = 1024 * 1024):
+        self.skeleton_limit = skeleton_limit
+        self.skeleton = bytearray()
+        self.sinks: list = []
+        self.state = self.SEARCH
+        # Unprocessed bytes carried to the next chunk (partial key or partial escape)
+        self._pending = b""
+        # Base64 characters not yet forming a full 4-char group
+        self._quad = b""
+        self.bytes_in = 0
+
+    def feed(self, chunk: bytes):
+        self.bytes_in += len(chunk)
+        data = self._pending + chunk
+        self._pending = b""
+        while data:
+            if self.state == self.SEARCH:
+                data = self._search(data)
+            elif self.state == self.VALUE_START:
+                data = self._value_start(data)
+            else:
+                data = self._value(data)
+
+    def _append_skeleton(self, data: bytes):
+        self.skeleton += data
+        if len(self.skeleton) > self.skeleton_limit:
+            raise ValueError("Image API response has too much non-image data")
+
+    def _search(self, data: bytes):
+        index = data.find(B64_FIELD)
+        if index == -1:
+            # Keep possible beginning of the key for the next chunk
+            keep = len(B64_FIELD) - 1
+            self._append_skeleton(data[:-keep] if len(data) > keep else b"")
+            self._pending = data[-keep:] if len(data) > keep else data
+            return b""
+        end = index + len(B64_FIELD)
+        self._append_skeleton(data[:end])
+        self.state = self.VALUE_START
+        return data[end:]
+
+    def _value_start(self, data: bytes):
+        data = data.lstrip(WHITESPACE)
+        if not data:
+            return b""
+        if data[:1] == b":":
+            self._append_skeleton(b":")
+            return data[1:]
+        if data[:1] != b'"':
+            raise ValueError("Unexpected b64_json value in image API response")
+        self._append_skeleton(b'"')
+        self.sinks.append(tempfile.SpooledTemporaryFile(max_size=settings.STREAM_SPOOL_MAX_KB * 1024))
+        self.state = self.VALUE
+        return data[1:]
+
+    def _value(self, data: bytes):
+        end = data.find(b'"')
+        part = data if end == -1 else data[:end]
+        # Escaped slash in JSON strings - carry lone trailing backslash to the next chunk
+        if end == -1 and part.endswith(b"\\"):
+            self._pending = b"\\"
+            part = part[:-1]
+        part = part.replace(b"\\/", b"/")
+
+        quad = self._quad + part
+        usable = len(quad) - len(quad) % 4
+        if usable:
+            self.sinks[-1].write(base64.b64decode(quad[:usable]))
+        self._quad = quad[usable:]
+
+        if end == -1:
+            return b""
+
+        # Closing quote - flush what's left (padding errors surface here)
+        if self._quad:
+            self.sinks[-1].write(base64.b64decode(self._quad + b"=" * (-len(self._quad) % 4)))
+            self._quad = b""
+        self._append_skeleton(b'"')
+        self.state = self.SEARCH
+        return data[end + 1:]
+
+    # Finish stream - returns (parsed skeleton JSON, list of decoded image buffers)
+    def finish(self):
+        if self.state != self.SEARCH:
+            raise ValueError("Image API response ended inside b64_json value")
+        self._append_skeleton(self._pending)
+        self._pending = b""
+        document = json.loads(bytes(self.skeleton))
+        return document, [spool_to_buffer(sink) for sink in self.sinks]
+
+
+# Turn spooled file into bytes-like buffer: small files are read into memory,
+# rolled-over files are memory-mapped so the image stays in page cache, not on the heap.
+def spool_to_buffer(sink):
+    size = sink.tell()
+    sink.seek(0)
+    if size == 0:
+        sink.close()
+        return b""
+    if size <= settings.STREAM_SPOOL_MAX_KB * 1024:
+        data = sink.read()
+        sink.close()
+        return data
+    buffer = mmap.mmap(sink.fileno(), 0, access=mmap.ACCESS_READ)
+    # Mapping stays valid after the temp file is closed and removed
+    sink.close()
+    return buffer
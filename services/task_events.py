@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+# In-process pub/sub for task status changes.
+# Every waiting client gets its own small queue, so publishing is O(subscribers of that task)
+# and tasks nobody watches cost nothing. Changes made by other workers are not published
+# here - subscribers re-check the task store periodically for those.
+class TaskEventBus:
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        # task_id -> set of subscriber queues
+        self._subscribers: dict = {}
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def publish(self, task_id: str, data: dict):
+        queues = self._subscribers.get(task_id)
+        self.stats["published"] += 1
+        if not queues:
+            return
+        for queue in queues:
+            if queue.full():
+                # Slow consumer - drop the oldest event, the newest state matters most
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(data)
+            self.stats["delivered"] += 1
+
+    @contextmanager
+    def subscribe(self, task_id: str):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(task_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[task_id]
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "watched_tasks": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values())
+        }
+
+task_events = TaskEventBus()
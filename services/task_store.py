@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Task statuses after which a task never changes again
+FINAL_STATUSES = ("completed", "failed")
+
+
+# Base interface for task state storage
+class TaskStore:
+
+    # Insert new task record - stored with version 0
+    async def create(self, task_id: str, data: dict):
+        raise NotImplementedError
+
+    # Return task record or None
+    async def get(self, task_id: str):
+        raise NotImplementedError
+
+    # Atomically replace task record if current status is one of from_statuses (None = any non-final).
+    # Every accepted write increments the record's version, also when the status stays the same.
+    # Returns False when the transition was not allowed (e.g. task already finished).
+    async def transition(self, task_id: str, data: dict, from_statuses: Optional[tuple] = None):
+        raise NotImplementedError
+
+    # Delete finished tasks older than ttl seconds, returns number of removed tasks
+    async def purge_expired(self, ttl: float):
+        raise NotImplementedError
+
+    async def count(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+# Process-local store - fine for a single worker and tests
+class MemoryTaskStore(TaskStore):
+
+    def __init__(self):
+        # task_id -> (data, finished_at)
+        self._tasks: dict = {}
+
+    async def create(self, task_id: str, data: dict):
+        self._tasks[task_id] = ({**data, "version": 0}, None)
+
+    async def get(self, task_id: str):
+        entry = self._tasks.get(task_id)
+        return dict(entry[0]) if entry else None
+
+    async def transition(self, task_id: str, data: dict, from_statuses: Optional[tuple] = None):
+        entry = self._tasks.get(task_id)
+        if entry is None or not _allowed(entry[0]["status"], from_statuses):
+            return False
+        finished_at = time.time() if data["status"] in FINAL_STATUSES else None
+        self._tasks[task_id] = ({**data, "version": entry[0].get("version", 0) + 1}, finished_at)
+        return True
+
+    async def purge_expired(self, ttl: float):
+        cutoff = time.time() - ttl
+        expired = [
+            task_id for task_id, (_, finished_at) in self._tasks.items()
+            if finished_at is not None and finished_at < cutoff
+        ]
+        for task_id in expired:
+            del self._tasks[task_id]
+        return len(expired)
+
+    async def count(self):
+        return len(self._tasks)
+
+
+# SQLite store in WAL mode - shared by all uvicorn workers on the host
+class SQLiteTaskStore(TaskStore):
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection per process, used from worker threads one at a time
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks (finished_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)")
+            self._conn = conn
+        return self._conn
+
+    # Run blocking sqlite call in a thread so the event loop never waits on disk or locks
+    async def _run(self, fn, *args):
+        def call():
+            with self._lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(call)
+
+    async def create(self, task_id: str, data: dict):
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT INTO tasks (task_id, status, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (task_id, data["status"], json.dumps({**data, "version": 0}), now, now)
+            )
+        await self._run(op)
+
+    async def get(self, task_id: str):
+        def op(conn):
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            return json.loads(row[0]) if row else None
+        return await self._run(op)
+
+    async def transition(self, task_id: str, data: dict, from_statuses: Optional[tuple] = None):
+        def op(conn):
+            now = time.time()
+            finished_at = now if data["status"] in FINAL_STATUSES else None
+            # Status check and update in one statement - atomic across workers
+            if from_statuses:
+                statuses, operator = from_statuses, "IN"
+            else:
+                statuses, operator = FINAL_STATUSES, "NOT IN"
+            condition = f"status {operator} ({','.join('?' * len(statuses))})"
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, "
+                "data = json_set(?, '$.version', COALESCE(json_extract(data, '$.version'), 0) + 1), "
+                f"updated_at = ?, finished_at = ? WHERE task_id = ? AND {condition}",
+                (data["status"], json.dumps(data), now, finished_at, task_id, *statuses)
+            )
+            return cursor.rowcount == 1
+        return await self._run(op)
+
+    async def purge_expired(self, ttl: float):
+        def op(conn):
+            cursor = conn.execute(
+                "DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - ttl,)
+            )
+            return cursor.rowcount
+        return await self._run(op)
+
+    async def count(self):
+        def op(conn):
+            return conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return await self._run(op)
+
+    async def close(self):
+        def op(conn):
+            conn.close()
+        if self._conn is not None:
+            await self._run(op)
+            self._conn = None
+
+
+def _allowed(status: str, from_statuses: Optional[tuple]):
+    if from_statuses:
+        return status in from_statuses
+    return status not in FINAL_STATUSES
+
+
+# Periodically remove finished tasks so the store stays flat over long uptime
+class TaskStoreJanitor:
+
+    def __init__(self, store: TaskStore):
+        self.store = store
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.store.close()
+
+    async def _run(self):
+        while True:
+            try:
+                removed = await self.store.purge_expired(settings.TASK_TTL)
+                if removed:
+                    logger.info(f"Purged {removed} expired tasks")
+            except Exception as e:
+                logger.error(f"Task purge failed: {str(e)}")
+            await asyncio.sleep(settings.TASK_PURGE_INTERVAL)
+
+
+# Pick backend from settings
+def create_task_store():
+    if settings.TASK_STORE_BACKEND == "memory":
+        return MemoryTaskStore()
+    return SQLiteTaskStore(settings.TASK_STORE_PATH)
+
+task_store = create_task_store()
+task_store_janitor = TaskStoreJanitor(task_store)
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from config import settings
+from services.brief_index import brief_words
+from services.image_service import ImageArtifact
+from services.job_scheduler import job_scheduler
+from services.metrics import WARM_POOL_REQUESTS, WARM_POOL_GENERATIONS
+from services.result_cache import result_cache
+from services.storage_retention import MockupIndex, mockup_index
+
+logger = logging.getLogger(__name__)
+
+# Meta keys in the storage index - one worker per host refills, the daily budget is shared
+REFILL_LEASE = "warm_pool_lease"
+BUDGET_KEY = "warm_pool_budget"
+
+
+# Words of a keyword, lowercase without diacritics and punctuation
+def keyword_words(text: str):
+    return set(brief_words(text))
+
+# Parse refill hours "0-6,22-24" -> [(0, 6), (22, 24)], ranges may wrap midnight ("22-6")
+def parse_hours(value: Optional[str]):
+    hours = []
+    for item in (value or "").split(","):
+        start, _, end = item.partition("-")
+        if start.strip() and end.strip():
+            hours.append((int(start), int(end)))
+    return hours
+
+def _in_hours(hours: list, hour: int):
+    if not hours:
+        return True
+    for start, end in hours:
+        if start <= end and start <= hour < end:
+            return True
+        if start > end and (hour >= start or hour < end):
+            return True
+    return False
+
+# Generic prompt keyword pooled mockups are generated with, e.g. "real estate"
+def pool_keyword(industry: str):
+    return re.sub(r"[_-]+", " ", industry)
+
+# Entry files of an industry, oldest first - name prefix is the creation time
+def _list_entries(directory: Path):
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith(".bin"))
+    except FileNotFoundError:
+        return []
+
+def _write_entry(directory: Path, image_data: bytes, meta: dict):
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{int(time.time() * 1000):015d}_{uuid.uuid4().hex[:8]}"
+    # Meta first, data renamed into place last - readers only pick up complete entries
+    (directory / f"{name}.json").write_text(json.dumps(meta), encoding="utf-8")
+    tmp_path = directory / f"{name}.tmp"
+    tmp_path.write_bytes(image_data)
+    os.replace(tmp_path, directory / f"{name}.bin")
+
+# Claim oldest entry matching signature - rename is atomic, so with several workers every
+# entry is served once. Entries of another model / size / encoding are removed.
+def _claim_entry(directory: Path, signature: str):
+    for name in _list_entries(directory):
+        data_path = directory / name
+        claimed_path = data_path.with_suffix(f".{os.getpid()}.claimed")
+        meta_path = data_path.with_suffix(".json")
+        try:
+            os.rename(data_path, claimed_path)
+        except FileNotFoundError:
+            continue
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("signature") == signature:
+                return claimed_path.read_bytes(), meta
+        except (OSError, ValueError):
+            pass
+        finally:
+            for path in (claimed_path, meta_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+    return None
+
+
+# Pre-generated mockups for generic briefs - no additional_details and a keyword made of the
+# industry name and WARM_POOL_GENERIC_WORDS only. Such requests get a pooled mockup as a
+# priority job instead of waiting for the image API. The pool holds up to WARM_POOL_SIZE
+# mockups for each of WARM_POOL_INDUSTRIES (or the WARM_POOL_TOP most requested) and is
+# refilled in WARM_POOL_HOURS when the job queue is idle, within WARM_POOL_DAILY_BUDGET
+# generations a day. Demand is counted per worker - with load-balanced workers the one
+# refilling sees a representative sample.
+class WarmPool:
+
+    def __init__(self, index: MockupIndex):
+        self.index = index
+        self.enabled = settings.WARM_POOL_ENABLED
+        self.path = Path(settings.IMAGE_STORAGE_PATH) / ".warm_pool"
+        self.size = settings.WARM_POOL_SIZE
+        self.industries = [value.strip() for value in settings.WARM_POOL_INDUSTRIES.split(",") if value.strip()]
+        self.top = settings.WARM_POOL_TOP
+        self.hours = parse_hours(settings.WARM_POOL_HOURS)
+        self.daily_budget = settings.WARM_POOL_DAILY_BUDGET
+        self.interval = settings.WARM_POOL_INTERVAL
+        self.generic_words = keyword_words(settings.WARM_POOL_GENERIC_WORDS)
+        self.owner = str(os.getpid())
+        self._task: Optional[asyncio.Task] = None
+        # industry -> eligible requests seen by this worker
+        self._demand: Counter = Counter()
+        # industry -> pooled entries, refreshed by refills and takes (hint only - claims decide)
+        self._levels: dict = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "generations": 0,
+            "failures": 0,
+            "refill_seconds": 0.0,
+            "refill_bytes": 0,
+            "last_refill": None
+        }
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"Warm pool refill failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    # Generic brief in the default output encoding - counted as demand for its industry
+    def eligible(self, request):
+        if not self.enabled or request.additional_details and request.additional_details.strip():
+            return False
+        if request.output_format is not None and request.output_format.value != settings.OUTPUT_FORMAT:
+            return False
+        if request.output_compression is not None and request.output_compression != settings.OUTPUT_COMPRESSION:
+            return False
+        industry = request.industry.value
+        words = keyword_words(request.keyword)
+        if not words or not words <= self.generic_words | keyword_words(pool_keyword(industry)):
+            return False
+        self._demand[industry] += 1
+        return True
+
+    # Pooled mockup likely available - the handler queues such requests ahead of generations
+    def available(self, industry: str):
+        return self._levels.get(industry, 0) > 0
+
+    # Take a pooled mockup for an eligible request - (image_data, revised_prompt) or None
+    async def take(self, services, industry: str):
+        signature = self._signature(services, industry)
+        claimed = await asyncio.to_thread(_claim_entry, self.path / industry, signature)
+        if claimed is None:
+            self._levels[industry] = 0
+            self.stats["misses"] += 1
+            WARM_POOL_REQUESTS.labels(result="miss").inc()
+            return None
+        self._levels[industry] = max(0, self._levels.get(industry, 1) - 1)
+        self.stats["hits"] += 1
+        WARM_POOL_REQUESTS.labels(result="hit").inc()
+        image_data, meta = claimed
+        return image_data, meta.get("revised_prompt", "")
+
+    # Model, size and default encoding the entry was generated with
+    @staticmethod
+    def _signature(services, industry: str):
+        return result_cache.make_key(pool_keyword(industry), industry, None, services.openai.output_options())
+
+    # Industries kept warm - configured list or the most requested ones
+    def targets(self):
+        if self.industries:
+            return self.industries
+        return [industry for industry, _ in self._demand.most_common(self.top)]
+
+    def _count_levels(self, industries: list):
+        return {industry: len(_list_entries(self.path / industry)) for industry in industries}
+
+    # Generations left today (shared by workers through the storage index)
+    async def _budget_left(self):
+        today = time.strftime("%Y-%m-%d")
+        day, _, used = (await self.index.get_meta(BUDGET_KEY) or "").partition(":")
+        return today, self.daily_budget - (int(used) if day == today else 0)
+
+    def _busy(self):
+        stats = job_scheduler.get_stats()
+        return stats["queued"] > 0 or stats["running"] >= stats["workers"]
+
+    # One refill round - returns its report, or None outside refill hours / without the lease
+    async def refill(self):
+        targets = self.targets()
+        self._levels.update(await asyncio.to_thread(self._count_levels, targets))
+        if not _in_hours(self.hours, time.localtime().tm_hour):
+            return None
+        if not await self.index.acquire_lease(REFILL_LEASE, self.owner, self.interval * 2):
+            return None
+
+        # Pool services are loaded only once a refill actually runs
+        from dependencies import get_mockup_services
+        services = None
+        report = {"generated": 0, "failed": 0, "seconds": 0.0, "bytes": 0, "stopped": None}
+        for industry in sorted(targets, key=lambda industry: self._levels.get(industry, 0)):
+            while self._levels.get(industry, 0) < self.size:
+                today, budget_left = await self._budget_left()
+                if budget_left <= 0:
+                    report["stopped"] = "budget"
+                    break
+                if self._busy():
+                    report["stopped"] = "busy"
+                    break
+                # Long rounds keep the lease while generating
+                await self.index.acquire_lease(REFILL_LEASE, self.owner, self.interval * 2)
+                await self.index.set_meta(BUDGET_KEY, f"{today}:{self.daily_budget - budget_left + 1}")
+                if services is None:
+                    services = await get_mockup_services()
+                if not await self._generate(services, industry, report):
+                    break
+            if report["stopped"]:
+                break
+
+        if report["generated"] or report["failed"]:
+            report["seconds"] = round(report["seconds"], 1)
+            report["finished_at"] = time.time()
+            self.stats["last_refill"] = report
+            logger.info(
+                f"Warm pool refill: generated {report['generated']}, failed {report['failed']} "
+                f"in {report['seconds']:.1f}s, levels {self._levels}"
+            )
+        return report
+
+    # Generate and validate one pooled mockup - False when the image API failed
+    async def _generate(self, services, industry: str, report: dict):
+        upstream_stats = {}
+        started = time.perf_counter()
+        try:
+            image_data, revised_prompt = await services.openai.generate_mockup_image(
+                keyword=pool_keyword(industry),
+                industry=industry,
+                stats=upstream_stats,
+                output=services.openai.output_options()
+            )
+            artifact = ImageArtifact(image_data)
+            if not await services.image.validate_image_data(artifact):
+                raise Exception("Generated image validation failed")
+        except Exception as e:
+            logger.warning(f"Warm pool generation for {industry} failed: {str(e)}")
+            self._record(report, "failed", started, upstream_stats)
+            return False
+
+        meta = {
+            "industry": industry,
+            "revised_prompt": revised_prompt,
+            "signature": self._signature(services, industry),
+            "created_at": time.time()
+        }
+        await asyncio.to_thread(_write_entry, self.path / industry, artifact.buffer, meta)
+        self._levels[industry] = self._levels.get(industry, 0) + 1
+        self._record(report, "generated", started, upstream_stats)
+        return True
+
+    # Refill cost - generations, upstream time and transferred bytes
+    def _record(self, report: dict, status: str, started: float, upstream_stats: dict):
+        seconds = time.perf_counter() - started
+        transferred = upstream_stats.get("bytes_transferred", 0)
+        report[status] += 1
+        report["seconds"] += seconds
+        report["bytes"] += transferred
+        self.stats["generations" if status == "generated" else "failures"] += 1
+        self.stats["refill_seconds"] += seconds
+        self.stats["refill_bytes"] += transferred
+        WARM_POOL_GENERATIONS.labels(status=status).inc()
+
+    def get_stats(self):
+        requests = self.stats["hits"] + self.stats["misses"]
+        generations = self.stats["generations"] + self.stats["failures"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "refill_seconds": round(self.stats["refill_seconds"], 1),
+            "hit_rate": round(self.stats["hits"] / requests, 3) if requests else None,
+            "estimated_cost": round(generations * settings.WARM_POOL_IMAGE_COST, 4),
+            "levels": dict(self._levels),
+            "demand": dict(self._demand.most_common(self.top))
+        }
+
+warm_pool = WarmPool(mockup_index)